@@ -0,0 +1,316 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from dataclasses import asdict, dataclass, replace
+from typing import Callable, Iterator
+
+import jb_api_gen
+
+# Benchmarks for the slower parts of jb_api_gen.py, meant to be run from the repo folder
+# Input data is generated here so results don't depend on whatever logs happen to be around
+
+
+@dataclass
+class CorpusOptions:
+    size_mb: float = 10
+    depth: int = 2  # Levels of nested objects in room messages
+    list_length: int = 8  # Most entries in the player/choice lists
+    enum_values: int = 6  # Distinct values for each of the enum-like fields
+    use_bc: bool = True  # bc:room/bc:customer:<ID> keys instead of room/player:<ID>
+    seed: int = 0
+    chatter: float = 0.0  # Share of lines that are messages nothing is done with (ok, action:<ID> objects etc.)
+
+
+# Lines the browser console adds around the actual messages
+_NOISE_LINES = [
+    "[loader] load success",
+    "D_0e_jtX.js:12:238 some text {not json} here",
+    "D_0e_jtX.js:3:1049 [Ecast] socket opened",
+    "Download the React DevTools for a better development experience",
+]
+
+
+def _enum_pool(prefix: str, count: int) -> list[str]:
+    return [f"{prefix}{i}" for i in range(count)]
+
+
+def _make_nested(rng: random.Random, depth: int) -> dict[str, object]:
+    nested: dict[str, object] = {"id": rng.randint(0, 999), "label": rng.choice(["a", "b", None])}
+    if depth > 1:
+        nested["child"] = _make_nested(rng, depth - 1)
+    return nested
+
+
+def _make_room(rng: random.Random, options: CorpusOptions = CorpusOptions()) -> dict[str, object]:
+    room = {
+        "state": rng.choice(_enum_pool("State", options.enum_values)),
+        "round": rng.randint(1, 3),
+        "timer": rng.choice([30, 45.5, None]),
+        "prompt": {"id": rng.randint(0, 9999), "text": "Some prompt text", "tags": ["a", "b"]},
+        "players": [
+            {"name": f"Player{i}", "score": rng.randint(0, 5000), "avatar": {"id": i, "color": "red"}}
+            for i in range(rng.randint(1, options.list_length))
+        ],
+        "audience": {"count": rng.randint(0, 100), "votes": [rng.randint(0, 5) for _ in range(4)]},
+    }
+    if options.depth > 0:
+        room["settings"] = _make_nested(rng, options.depth)
+    return room
+
+
+def _make_player(rng: random.Random) -> dict[str, object]:
+    return {
+        "state": rng.choice(["Lobby", "Writing", "Waiting"]),
+        "playerName": f"Player{rng.randint(0, 7)}",
+        "isVIP": rng.random() < 0.1,
+        "score": rng.randint(0, 5000),
+        "prompt": rng.choice(["Some prompt text", None]),
+    }
+
+
+# What most of the messages in logs of newer games look like
+def _make_chatter(rng: random.Random, seq: int) -> str:
+    kind = rng.random()
+    if kind < 0.5:
+        val = {
+            "kind": "countdown",
+            "remaining": rng.randint(0, 60),
+            "entries": [{"id": i, "text": "Some entry text", "votes": rng.randint(0, 9)} for i in range(8)],
+        }
+        msg = {"pc": seq, "opcode": "object", "result": {"key": f"action:{rng.randint(0, 99)}", "val": val}}
+    elif kind < 0.7:
+        descriptions = [{"category": "lobby", "id": i, "text": f"Player{i} joined."} for i in range(4)]
+        val = {"latestDescriptions": descriptions}
+        msg = {"pc": seq, "opcode": "object", "result": {"key": "textDescriptions", "val": val}}
+    else:
+        msg = {"pc": seq, "opcode": rng.choice(["ok", "text", "drop"]), "result": {}}
+    return f"recv {json.dumps(msg)}"
+
+
+def _make_message(rng: random.Random, options: CorpusOptions, seq: int) -> str:
+    if options.chatter > 0 and rng.random() < options.chatter:
+        return _make_chatter(rng, seq)
+    room_key = "bc:room" if options.use_bc else "room"
+    player_key = f"bc:customer:{rng.randint(0, 7)}" if options.use_bc else f"player:{rng.randint(0, 7)}"
+    kind = rng.random()
+    if kind < 0.25:
+        return rng.choice(_NOISE_LINES)
+    elif kind < 0.55:
+        msg = {"pc": seq, "opcode": "object", "result": {"key": room_key, "val": _make_room(rng, options)}}
+        return f"recv {json.dumps(msg)}"
+    elif kind < 0.75:
+        player = _make_player(rng) | {
+            "choiceType": rng.choice(_enum_pool("pick-", options.enum_values)),
+            "choices": [{"text": "x", "choiceId": i} for i in range(rng.randint(0, options.list_length))],
+        }
+        msg = {"pc": seq, "opcode": "object", "result": {"key": player_key, "val": player}}
+        return json.dumps(msg, indent=rng.choice([None, 2]))  # Some consoles pretty print messages
+    elif kind < 0.85:
+        body = {"action": rng.choice(["choose", "write", "skip"]), "choice": rng.randint(0, 3)}
+        return json.dumps({"seq": seq, "opcode": "client/send", "params": {"from": 2, "to": 1, "body": body}})
+    elif kind < 0.90:
+        return json.dumps({"seq": seq, "opcode": "text/update", "params": {"key": "entertext:5", "val": "hi"}})
+    elif kind < 0.95:
+        params = {"key": "answer:5", "val": {"text": "hi", "done": rng.random() < 0.5}}
+        return json.dumps({"seq": seq, "opcode": "object/update", "params": params})
+    return json.dumps({"pc": seq, "opcode": rng.choice(["ok", "text", "drop"]), "result": {}})
+
+
+# Same options always give the same log
+def generate_log(options: CorpusOptions) -> Iterator[str]:
+    rng = random.Random(options.seed)
+    target = int(options.size_mb * (1 << 20))
+    size = 0
+    seq = 0
+    while size < target:
+        seq += 1
+        line = _make_message(rng, options, seq) + "\n"
+        size += len(line)
+        yield line
+
+
+def _best_time(func: Callable[[], object], repeat: int) -> float:
+    return min(timeit.repeat(func, timer=time.process_time, number=1, repeat=repeat))
+
+
+def _time_tracking(name: str, msgs: list[dict], repeat: int, use_shapes: bool) -> None:
+    def run() -> None:
+        data: jb_api_gen.SubfieldData = {}
+        shapes: jb_api_gen.MessageShapes = {} if use_shapes else None
+        for msg in msgs:
+            jb_api_gen._track_receive_data(msg, data, shapes)
+
+    best = _best_time(run, repeat)
+    print(f"{name}: {len(msgs) / best:,.0f} messages/s ({best * 1e6 / len(msgs):.2f} us/message)")
+
+
+def bench_update(count: int, repeat: int) -> None:
+    rng = random.Random(0)
+    msgs = [_make_room(rng) for _ in range(count)]
+    players = [_make_player(rng) for _ in range(count)]
+
+    _time_tracking("FieldData.update (room)", msgs, repeat, False)
+    _time_tracking("FieldData.update (room, shape cache)", msgs, repeat, True)
+    _time_tracking("FieldData.update (player)", players, repeat, False)
+    _time_tracking("FieldData.update (player, shape cache)", players, repeat, True)
+
+    # Size of the resulting tree, which is what sticks around for the rest of the run
+    tracemalloc.start()
+    data: jb_api_gen.SubfieldData = {}
+    for msg in msgs:
+        jb_api_gen._track_receive_data(msg, data)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"FieldData tree: {size:,} bytes")
+
+
+# Each stage is timed on its own, with the log already in memory so disk speed doesn't come into it
+def bench_stages(options: CorpusOptions, repeat: int) -> dict[str, float]:
+    raw = memoryview("".join(generate_log(options)).encode())
+    chunks = [raw[i : i + jb_api_gen._CHUNK_SIZE] for i in range(0, len(raw), jb_api_gen._CHUNK_SIZE)]
+    msgs = list(jb_api_gen._transform_to_json(chunks, "opcode"))
+    objects = [msg for msg in msgs if msg["opcode"] == "object"]
+    sends = [msg["params"]["body"] for msg in msgs if msg["opcode"] == "client/send"]
+
+    def receive() -> None:
+        data = jb_api_gen.DataSet()
+        for msg in objects:
+            jb_api_gen._sort_object_by_key(data, msg)
+
+    def send() -> None:
+        data = jb_api_gen.DataSet()
+        for body in sends:
+            jb_api_gen._track_send_data(data, "client/send", body)
+
+    data = jb_api_gen.DataSet(enum_data={"state": set(), "choiceType": set()})
+    with contextlib.redirect_stdout(io.StringIO()):
+        for msg in msgs:
+            jb_api_gen._handle_message(data, msg)
+    jb_api_gen._index_fields(data)
+
+    with tempfile.TemporaryDirectory() as src_dir:
+        os.mkdir(f"{src_dir}/Engines")
+        with contextlib.redirect_stdout(io.StringIO()):
+            output_time = _best_time(lambda: jb_api_gen._output_as_cs(data, "Bench", src_dir, True), repeat)
+
+    extract_time = _best_time(lambda: sum(1 for _ in jb_api_gen._transform_to_json(chunks, "opcode")), repeat)
+    # Same as a real run does, messages no handler wants are skipped without decoding them
+    skip = jb_api_gen._message_filter(["state", "choiceType"])
+    filtered_time = _best_time(lambda: sum(1 for _ in jb_api_gen._transform_to_json(chunks, "opcode", skip)), repeat)
+    receive_time = _best_time(receive, repeat)
+    send_time = _best_time(send, repeat)
+    return {
+        "size_mb": options.size_mb,
+        "bytes": len(raw),
+        "messages": len(msgs),
+        "extract_s": extract_time,
+        "extract_mb_per_s": len(raw) / (1 << 20) / extract_time,
+        "filtered_extract_s": filtered_time,
+        "filtered_extract_mb_per_s": len(raw) / (1 << 20) / filtered_time,
+        "receive_s": receive_time,
+        "receive_messages_per_s": len(objects) / receive_time,
+        "send_s": send_time,
+        "send_messages_per_s": len(sends) / send_time,
+        "output_s": output_time,
+    }
+
+
+_COMPARED_RESULTS = ["extract_s", "filtered_extract_s", "receive_s", "send_s", "output_s"]
+
+
+def _print_stage_results(results: list[dict[str, float]], previous: list[dict[str, float]]) -> None:
+    print(f'{"MB":>6} {"messages":>9} {"extract":>12} {"filtered":>12} {"receive":>15} {"send":>15} {"output":>9}')
+    for result in results:
+        print(
+            f'{result["size_mb"]:>6g} {result["messages"]:>9,}'
+            f' {result["extract_mb_per_s"]:>7.1f} MB/s'
+            f' {result["filtered_extract_mb_per_s"]:>7.1f} MB/s'
+            f' {result["receive_messages_per_s"]:>9,.0f} msg/s'
+            f' {result["send_messages_per_s"]:>9,.0f} msg/s'
+            f' {result["output_s"] * 1000:>6.1f} ms'
+        )
+        # Only sizes that were run both times can be compared
+        old = next((old for old in previous if old["size_mb"] == result["size_mb"]), None)
+        if old is not None:
+            # Results saved before a stage was added don't have it
+            changes = ", ".join(
+                f"{name[:-2]} {old[name] / result[name]:.2f}x" for name in _COMPARED_RESULTS if name in old
+            )
+            print(f"       speedup vs previous: {changes}")
+
+
+def run_benchmarks(sizes: list[float], options: CorpusOptions, repeat: int, output: str, compare: str) -> None:
+    previous = []
+    if compare is not None:
+        with open(compare) as file:
+            previous = json.load(file)["results"]
+
+    results = [bench_stages(replace(options, size_mb=size), repeat) for size in sizes]
+    _print_stage_results(results, previous)
+
+    report = {
+        "python": sys.version,
+        "platform": platform.platform(),
+        "options": asdict(options),
+        "repeat": repeat,
+        "results": results,
+    }
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results saved to {output}")
+
+
+def _add_corpus_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = CorpusOptions()
+    parser.add_argument("--depth", type=int, default=defaults.depth, help="Levels of nested objects in rooms")
+    parser.add_argument("--list-length", type=int, default=defaults.list_length, help="Most entries in lists")
+    parser.add_argument("--enum-values", type=int, default=defaults.enum_values, help="Values of enum-like fields")
+    parser.add_argument("--no-bc", action="store_true", help="Use room/player:<ID> keys instead of bc: ones")
+    parser.add_argument("--seed", type=int, default=defaults.seed, help="Seed for the generated data")
+    parser.add_argument("--chatter", type=float, default=defaults.chatter, help="Share of messages that get ignored")
+
+
+def _corpus_options(args: argparse.Namespace, size_mb: float) -> CorpusOptions:
+    return CorpusOptions(
+        size_mb, args.depth, args.list_length, args.enum_values, not args.no_bc, args.seed, args.chatter
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark jb_api_gen.py")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="Write a synthetic console log")
+    generate_parser.add_argument("output", help="File to write the log to")
+    generate_parser.add_argument("--size", type=float, default=CorpusOptions.size_mb, help="Size of the log in MB")
+    _add_corpus_arguments(generate_parser)
+
+    run_parser = subparsers.add_parser("run", help="Time each stage of jb_api_gen.py on generated logs")
+    run_parser.add_argument("--sizes", type=float, nargs="+", default=[1, 10], help="Log sizes to run, in MB")
+    run_parser.add_argument("-r", "--repeat", type=int, default=3, help="Number of runs, the best one is reported")
+    run_parser.add_argument("-o", "--output", default="jb_api_bench_results.json", help="Where to save results")
+    run_parser.add_argument("--compare", metavar="RESULTS_FILE", help="Earlier results to compare against")
+    _add_corpus_arguments(run_parser)
+
+    update_parser = subparsers.add_parser("update", help="Time FieldData.update on generated messages")
+    update_parser.add_argument("-n", "--count", type=int, default=20000, help="Number of messages per run")
+    update_parser.add_argument("-r", "--repeat", type=int, default=5, help="Number of runs, the best one is reported")
+
+    args = parser.parse_args()
+    match args.command:
+        case "generate":
+            with open(args.output, "w") as file:
+                file.writelines(generate_log(_corpus_options(args, args.size)))
+        case "run":
+            run_benchmarks(args.sizes, _corpus_options(args, 0), args.repeat, args.output, args.compare)
+        case "update":
+            bench_update(args.count, args.repeat)
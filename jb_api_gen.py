@@ -1,11 +1,37 @@
-import builtins
+import argparse
+import asyncio
+import base64
+import bz2
+import gzip
+import hashlib
 import json
+import lzma
+import math
+import mmap
 import os
+import re
+import struct
 import sys
-from dataclasses import dataclass, field
-from io import TextIOWrapper
+import time
+import urllib.parse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from fnmatch import fnmatch
+from functools import partial
+from io import StringIO
+from itertools import chain, repeat
 from pathlib import Path
-from typing import Any
+from typing import Any, BinaryIO, Callable, Generator, Iterable, Iterator, TextIO
+
+try:
+    import zstandard  # Optional, only needed for .zst input
+except ImportError:
+    zstandard = None
+try:
+    import resource  # Only used for the peak memory in --stats, not available on Windows
+except ImportError:
+    resource = None
 
 # There's probably an existing tool that can do some of this stuff (as in JSON -> C# struct)
 # But I enjoy reinventing the wheel (aka I like writing scripts)
@@ -19,86 +45,309 @@ def _capitalize_first(s: str) -> str:
 
 
 SubfieldData = dict[str, "FieldData"]
+# Maps the layout of a message (its keys and the type of each value) to the keys holding objects/lists
+MessageShapes = dict[tuple[tuple[str, ...], tuple[type, ...]], tuple[str, ...]]
+# Field name -> full path of each place it shows up (e.g. room.players[].name) -> what was seen there
+FieldIndex = dict[str, dict[str, "PathInfo"]]
+
+
+def _subfields_to_json(fields: SubfieldData) -> dict[str, Any]:
+    return {name: field.to_json() for name, field in fields.items()}
+
+
+def _subfields_from_json(obj: dict[str, Any]) -> SubfieldData:
+    return {sys.intern(name): FieldData.from_json(name, field) for name, field in obj.items()}
+
+
+def _merge_subfield_data(target: SubfieldData, source: SubfieldData) -> None:
+    for key, value in source.items():
+        if key in target:
+            target[key].merge(value)
+        else:
+            target[key] = value
+
+
+# Room/player values kept around for the generated reader tests
+_MAX_SAMPLES = 16
+# Samples of discarded input kept for --stats, and how much of each one
+_MAX_STATS_SAMPLES = 10
+_STATS_SAMPLE_SIZE = 80
+
+
+# Numbers for --stats, collected for each file and added up the same way as the rest of the DataSet
+@dataclass
+class Stats:
+    files: int = 0
+    input_bytes: int = 0
+    scanned_bytes: int = 0  # Same as input_bytes unless the input was compressed
+    message_bytes: int = 0
+    messages: int = 0
+    read_time: float = 0.0  # Reading, decompressing and extracting JSON
+    handle_time: float = 0.0  # Everything done with a message once it's extracted (FieldData.update etc.)
+    opcodes: Counter[str] = field(default_factory=Counter)
+    object_keys: Counter[str] = field(default_factory=Counter)
+    unhandled: Counter[str] = field(default_factory=Counter)
+    bad_candidates: int = 0  # Looked like the start of a JSON object but didn't parse
+    ignored_objects: int = 0  # Valid JSON, but not a message
+    skipped: int = 0  # Messages nothing needed to be done with, dropped without decoding (still counted as messages)
+    discarded: list[str] = field(default_factory=list)
+    largest: tuple[int, str] = (0, "")
+    deepest: tuple[int, str] = (0, "")  # Filled in once all the input has been merged
+    stages: dict[str, float] = field(default_factory=dict)  # Wall time of each top level step
+
+    def merge(self, other: "Stats") -> None:
+        for name in ("files", "input_bytes", "scanned_bytes", "message_bytes", "messages", "read_time", "handle_time"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.opcodes.update(other.opcodes)
+        self.object_keys.update(other.object_keys)
+        self.unhandled.update(other.unhandled)
+        self.bad_candidates += other.bad_candidates
+        self.ignored_objects += other.ignored_objects
+        self.skipped += other.skipped
+        for sample in other.discarded:
+            self._add_sample(sample)
+        self.largest = max(self.largest, other.largest)
+
+    # Counted the same way as _ingest_messages_with_stats does for decoded messages
+    def add_skipped(self, size: int, opcode: str, key: str | None) -> None:
+        self.skipped += 1
+        self.messages += 1
+        self.message_bytes += size
+        self.opcodes[opcode] += 1
+        description = opcode
+        if key is not None:
+            self.object_keys[_group_object_key(key)] += 1
+            description = f"{opcode} {_group_object_key(key)}"
+        if size > self.largest[0]:
+            self.largest = (size, description)
+
+    def _add_sample(self, sample: str) -> None:
+        if len(sample) > 0 and len(self.discarded) < _MAX_STATS_SAMPLES and sample not in self.discarded:
+            self.discarded.append(sample)
+
+    # Text is cut off at the end of buf, the last line is only used if it's the only one
+    def add_discarded(self, buf: bytes, start: int, end: int) -> None:
+        if len(self.discarded) >= _MAX_STATS_SAMPLES:
+            return
+        lines = bytes(buf[start : min(end, start + 4 * _STATS_SAMPLE_SIZE)]).splitlines()
+        if end - start > 4 * _STATS_SAMPLE_SIZE and len(lines) > 1:
+            lines.pop()
+        for line in lines:
+            self._add_sample(line.strip()[:_STATS_SAMPLE_SIZE].decode(errors="replace"))
+
+
+# Every outgoing message with the same opcode and action (or updated key), e.g. all of the client/send "choose" ones
+@dataclass
+class SentMessages:
+    fields: SubfieldData = field(default_factory=dict)
 
 
 @dataclass
 class DataSet:
-    send_data: set[frozenset[str]] = field(default_factory=set)
+    send_data: dict[tuple[str, str], SentMessages] = field(default_factory=dict)  # By (opcode, action/key)
     room_data: SubfieldData = field(default_factory=dict)
     player_data: SubfieldData = field(default_factory=dict)
     enum_data: dict[str, set[str]] = field(default_factory=dict)
+    string_data: dict[str, "ValueSketch"] = None  # Only collected for --auto-enums
+    field_index: FieldIndex = field(default_factory=dict)  # Filled in by _index_fields once input has been read
+    using_bc: bool = None
+    stats: Stats = None  # Only collected for --stats
+    shape_lookups: int = 0  # Player messages checked against player_shapes, and how many had a known layout
+    shape_hits: int = 0
+    # Values with a layout that hadn't been seen yet, used as test cases for the readers from --readers
+    room_samples: list[dict] = field(default_factory=list)
+    player_samples: list[dict] = field(default_factory=list)
+    # Only needed while input is being read: layouts of the player messages already merged into player_data, and of
+    # the room messages picked as samples so far (out of room_checks)
+    player_shapes: MessageShapes = field(default_factory=dict, repr=False, compare=False)
+    room_shapes: MessageShapes = field(default_factory=dict, repr=False, compare=False)
+    room_checks: int = field(default=0, repr=False, compare=False)
+
+    # Combine data from another set into this one, this set should be the one that was collected earlier
+    def merge(self, other: "DataSet") -> None:
+        for group, sent in other.send_data.items():
+            if group in self.send_data:
+                _merge_subfield_data(self.send_data[group].fields, sent.fields)
+            else:
+                self.send_data[group] = sent
+        _merge_subfield_data(self.room_data, other.room_data)
+        _merge_subfield_data(self.player_data, other.player_data)
+        for name, vals in other.enum_data.items():
+            self.enum_data.setdefault(name, set()).update(vals)
+        if self.string_data is not None and other.string_data is not None:
+            for name, sketch in other.string_data.items():
+                self.string_data.setdefault(name, ValueSketch()).merge(sketch)
+        for name, paths in other.field_index.items():
+            seen_paths = self.field_index.setdefault(name, {})
+            for path, info in paths.items():
+                if (seen := seen_paths.get(path)) is None:
+                    seen_paths[path] = PathInfo(info.types, info.files)
+                else:
+                    seen.types |= info.types
+                    seen.files += info.files
+        if self.using_bc is None:
+            self.using_bc = other.using_bc
+        if self.stats is not None and other.stats is not None:
+            self.stats.merge(other.stats)
+        self.shape_lookups += other.shape_lookups
+        self.shape_hits += other.shape_hits
+        self.room_samples.extend(other.room_samples[: max(0, _MAX_SAMPLES - len(self.room_samples))])
+        self.player_samples.extend(other.player_samples[: max(0, _MAX_SAMPLES - len(self.player_samples))])
+
+
+# Flags for each JSON type a field has been seen as, ordered the same way they're listed in output
+_TYPE_BOOL = 1 << 0
+_TYPE_DICT = 1 << 1
+_TYPE_FLOAT = 1 << 2
+_TYPE_INT = 1 << 3
+_TYPE_LIST = 1 << 4
+_TYPE_STR = 1 << 5
+_TYPE_NULL = 1 << 6
+_VALUE_TYPES = _TYPE_NULL - 1
+
+_TYPE_FLAGS: dict[type, int] = {
+    bool: _TYPE_BOOL,
+    dict: _TYPE_DICT,
+    float: _TYPE_FLOAT,
+    int: _TYPE_INT,
+    list: _TYPE_LIST,
+    str: _TYPE_STR,
+    type(None): _TYPE_NULL,
+}
+_TYPE_NAMES: dict[int, str] = {flag: t.__name__ for t, flag in _TYPE_FLAGS.items() if flag != _TYPE_NULL}
+_CS_TYPE_NAMES: dict[int, str] = {_TYPE_STR: "string", _TYPE_INT: "int", _TYPE_FLOAT: "double", _TYPE_BOOL: "bool"}
+
+
+def _iter_type_flags(types: int) -> Iterator[int]:
+    return (flag for flag in _TYPE_NAMES if types & flag)
+
+
+# Below this many objects/lists, updating them one at a time is quicker than FieldData.update_many
+_MIN_BATCH_SIZE = 8
 
 
 class FieldData:
+    # Lots of these get created for big room objects, so keep them small
+    __slots__ = ("_name", "_types", "_subdata")
+
     def __init__(self, name: str) -> None:
-        self._name = name
-        self._types: set[type] = set()
+        self._name = sys.intern(name)
+        self._types: int = 0  # _TYPE_* flags
         self._subdata: SubfieldData = {}
-        self._can_be_none: bool = False
 
-    def update(self, val: Any) -> None:
-        if val is None:
-            self._can_be_none = True
-            return
+    @property
+    def _can_be_none(self) -> bool:
+        return self._types & _TYPE_NULL != 0
 
-        next_type = type(val)
-        self._types.add(next_type)
+    @property
+    def _value_types(self) -> int:
+        return self._types & _VALUE_TYPES
 
-        if next_type is list and len(val) > 0:
+    def update(self, val: Any) -> None:
+        next_type = _TYPE_FLAGS[type(val)]
+        self._types |= next_type
+
+        if next_type == _TYPE_LIST and len(val) > 0:
             if "entry" not in self._subdata:
                 self._subdata["entry"] = self.__class__("entry")
-            self._subdata["entry"].update(val[0])
-        elif next_type is dict and len(val) > 0:
+            self._subdata["entry"].update_many(val)
+        elif next_type == _TYPE_DICT and len(val) > 0:
+            subdata = self._subdata
             for key, value in val.items():
-                if key not in self._subdata:
-                    self._subdata[key] = self.__class__(key)
-                self._subdata[key].update(value)
+                if (sub := subdata.get(key)) is None:
+                    sub = subdata[sys.intern(key)] = self.__class__(key)
+
+                # Most fields are plain values, skip the extra call for those
+                value_type = _TYPE_FLAGS[type(value)]
+                if value_type == _TYPE_LIST or value_type == _TYPE_DICT:
+                    sub.update(value)
+                else:
+                    sub._types |= value_type
+
+    # Same result as calling update for each value, but done a field at a time across all of the values
+    # Lists can have lots of entries with the same layout, and this keeps most of the work inside map/set
+    def update_many(self, vals: list) -> None:
+        val_types = set(map(type, vals))
+        has_lists = list in val_types
+        has_dicts = dict in val_types
+        # Small batches aren't worth the extra setup, and mixing lists with objects needs the original order of fields
+        if (has_lists or has_dicts) and (len(vals) < _MIN_BATCH_SIZE or (has_lists and has_dicts)):
+            for val in vals:
+                self.update(val)
+            return
+
+        for val_type in val_types:
+            self._types |= _TYPE_FLAGS[val_type]
+
+        if has_lists:
+            entries = list(chain.from_iterable(val for val in vals if type(val) is list))
+            if len(entries) > 0:
+                if "entry" not in self._subdata:
+                    self._subdata["entry"] = self.__class__("entry")
+                self._subdata["entry"].update_many(entries)
+        if has_dicts:
+            objs = vals if len(val_types) == 1 else [val for val in vals if type(val) is dict]
+            subdata = self._subdata
+            for key in dict.fromkeys(chain.from_iterable(objs)):
+                if (sub := subdata.get(key)) is None:
+                    sub = subdata[sys.intern(key)] = self.__class__(key)
+                sub.update_many([obj[key] for obj in objs if key in obj])
+
+    def merge(self, other: "FieldData") -> None:
+        self._types |= other._types
+        _merge_subfield_data(self._subdata, other._subdata)
+
+    # Cached as just the type flags, or [flags, {subfield name: ...}] for objects/lists
+    def to_json(self) -> int | list:
+        if len(self._subdata) == 0:
+            return self._types
+        return [self._types, _subfields_to_json(self._subdata)]
+
+    @classmethod
+    def from_json(cls, name: str, obj: int | list) -> "FieldData":
+        result = cls(name)
+        types, subdata = (obj, {}) if type(obj) is int else obj
+        if type(types) is not int:
+            raise ValueError(f"bad type flags for {name}")
+        result._types = types
+        result._subdata = _subfields_from_json(subdata)
+        return result
 
     def print(self, indent_level: int = 0) -> None:
         header = f'    {"".ljust(indent_level)}{self._name} ->'
         if len(self._subdata) == 0:  # basic type(s) only
             field_str = ""
-            for entry in self._types:
-                field_str += f"{entry.__name__} "
+            for entry in _iter_type_flags(self._types):
+                field_str += f"{_TYPE_NAMES[entry]} "
             if self._can_be_none:
                 field_str += "NULL"
             print(f"{header} {field_str}")
-        elif len(self._types) == 1 and next(iter(self._types)) == list:  # handle list manually
-            inner_type = next(iter(self._subdata["entry"]._types))
-            list_typing = inner_type.__name__ if "entry" in self._subdata else "unknown"
-            if len(self._subdata["entry"]._types) > 1:
+        elif self._value_types == _TYPE_LIST:  # handle list manually
+            inner_type = self._subdata["entry"]._value_types
+            list_typing = _TYPE_NAMES.get(inner_type, "unknown")
+            if inner_type.bit_count() > 1:
                 print('{header} WARNING: Unhandled type "list of complex type"')
-            elif inner_type is list:
+            elif inner_type == _TYPE_LIST:
                 print('{header} WARNING: Unhandled type "list of lists"')
-            elif inner_type is dict:
+            elif inner_type == _TYPE_DICT:
                 print(f'{header} list{" (can be NULL)" if self._can_be_none else ""}:')
                 self._subdata["entry"].print(indent_level + 4)
             else:
                 print(f'{header} list[{list_typing}]{" NULL" if self._can_be_none else ""}')
-        elif len(self._types) == 1 and next(iter(self._types)) == dict:  # recurse
+        elif self._value_types == _TYPE_DICT:  # recurse
             print(f'{header} object{" (can be NULL)" if self._can_be_none else ""}:')
             for field in self._subdata.values():
                 field.print(indent_level + 4)
         else:  # complicated
             field_str = ""
-            for entry in self._types:
-                field_str += f"{entry.__name__} "
+            for entry in _iter_type_flags(self._types):
+                field_str += f"{_TYPE_NAMES[entry]} "
             if self._can_be_none:
                 field_str += "NULL"
             print(f"{header} Complex Type ({field_str})")
 
-    def _python_type_to_cs_type(self, t: type) -> str:
-        match t:
-            case builtins.str:
-                return "string"
-            case builtins.int:
-                return "int"
-            case builtins.float:
-                return "double"
-            case builtins.bool:
-                return "bool"
-            case _:
-                return "UNHANDLED"
+    def _type_flag_to_cs_type(self, t: int) -> str:
+        return _CS_TYPE_NAMES.get(t, "UNHANDLED")
 
     def _determine_typing(self, enum_names: set[str], specifier: str) -> tuple[str, str, str, SubfieldData]:
         followup_name: str = None
@@ -108,61 +357,63 @@ class FieldData:
 
         if self._name in enum_names:  # Enum type
             type_name = _capitalize_first(self._name)
-        elif len(self._types) == 0:  # Type that is always null, add comment about it
+        elif self._value_types == 0:  # Type that is always null, add comment about it
             type_name = "JRaw"
             comment = " // Type is unknown because the value was always null in API data"
-        elif len(self._types) == 1:  # Only one type, easy
+        elif self._value_types.bit_count() == 1:  # Only one type, easy
             if len(self._subdata) == 0:
-                this_type = next(iter(self._types))
-                if this_type == list or this_type == dict:
+                this_type = self._value_types
+                if this_type == _TYPE_LIST or this_type == _TYPE_DICT:
                     type_name = "JRaw"
                     comment = " // Always empty list in API data"
                 else:
-                    type_name = self._python_type_to_cs_type(this_type)
-            elif next(iter(self._types)) == list:
-                inner_type = next(iter(self._subdata["entry"]._types))
-                if len(self._types) == 0:
-                    type_name = "JRaw"
-                    comment = " // Always empty in API data"
-                elif len(self._subdata["entry"]._types) > 1:
+                    type_name = self._type_flag_to_cs_type(this_type)
+            elif self._value_types == _TYPE_LIST:
+                entry = self._subdata["entry"]
+                inner_type = entry._value_types
+                entry_nullable = "?" if entry._can_be_none else ""
+                if inner_type == _TYPE_INT | _TYPE_FLOAT:  # Same as with plain fields, treat these as floats
+                    inner_type = _TYPE_FLOAT
+                if inner_type == 0:
+                    type_name = "List<JRaw>"
+                    comment = " // Entry type is unknown because they were always null in API data"
+                elif inner_type.bit_count() > 1:
                     type_name = "JRaw"
                     comment = ' // WARNING: Unhandled type "list of complex type"'
-                elif inner_type is list:
+                elif inner_type == _TYPE_LIST:
                     type_name = "JRaw"
                     comment = ' // WARNING: Unhandled type "list of lists"'
-                elif inner_type is dict:
+                elif inner_type == _TYPE_DICT:
                     followup_name = f"{specifier}{_capitalize_first(self._name)}"
                     followup_obj = self._subdata["entry"]._subdata
-                    type_name = f"List<{followup_name}>"
+                    type_name = f"List<{followup_name}{entry_nullable}>"
                 else:
-                    type_name = f'List<{self._python_type_to_cs_type(next(iter(self._subdata["entry"]._types)))}>'
-            elif next(iter(self._types)) == dict:
+                    type_name = f"List<{self._type_flag_to_cs_type(inner_type)}{entry_nullable}>"
+            elif self._value_types == _TYPE_DICT:
                 followup_name = f"{specifier}{_capitalize_first(self._name)}"
                 followup_obj = self._subdata
                 type_name = followup_name
         else:  # More than one type, complicated
             type_name = "JRaw"
             comment = " // Can be multiple types: "
-            for entry in self._types:
-                if entry == list:
+            for entry in _iter_type_flags(self._types):
+                if entry == _TYPE_LIST:
                     comment += f"List or "
-                elif entry == dict:
+                elif entry == _TYPE_DICT:
                     comment += f"Object or "
                 else:
-                    comment += f"{self._python_type_to_cs_type(entry)} or "
+                    comment += f"{self._type_flag_to_cs_type(entry)} or "
             comment = comment[:-4]
             if self._can_be_none:
                 comment += " (or null)"
 
         return type_name, comment, (followup_name, followup_obj)
 
-    def print_cs(
-        self, file: TextIOWrapper, enum_names: set[str], specifier: str, indent: str
-    ) -> tuple[str, SubfieldData]:
+    # C# type of the property, plus any comment that goes with it and the struct that still needs writing (if any)
+    def cs_typing(self, enum_names: set[str], specifier: str) -> tuple[str, str, tuple[str, SubfieldData]]:
         # Some fields come in as ints and floats at different times, treat such fields as floats
-        if len(self._types) > 1 and all(t == int or t == float for t in self._types):
-            self._types.clear()
-            self._types.add(float)
+        if self._value_types == _TYPE_INT | _TYPE_FLOAT:
+            self._types &= ~_TYPE_INT
 
         # Determine type, extra notes, and if there's a follow up
         type_name, comment, followup = self._determine_typing(enum_names, specifier)
@@ -170,6 +421,12 @@ class FieldData:
         # Mark as nullable if needed
         if type_name != "JRaw" and self._can_be_none:
             type_name += "?"
+        return type_name, comment, followup
+
+    def print_cs(
+        self, file: TextIO, enum_names: set[str], specifier: str, indent: str
+    ) -> tuple[str, SubfieldData]:
+        type_name, comment, followup = self.cs_typing(enum_names, specifier)
 
         # Assumed to already be inside the class
         file.write(f'\n{indent}[JsonProperty("{self._name}")]\n')
@@ -179,8 +436,176 @@ class FieldData:
         return followup
 
 
-def _output_template_files(game_name: str, src_folder_path: str, using_bc: bool) -> None:
+# Past this many distinct values a string field is assumed to be free text rather than an enum
+_MAX_EXACT_VALUES = 32
+_SKETCH_BITS = 6
+_SKETCH_REGISTERS = 1 << _SKETCH_BITS
+# Enum values end up as C# identifiers, anything that doesn't look like one is most likely free text
+_ENUM_VALUE_PATTERN = re.compile(r"[A-Za-z_][\w-]*")
+# Enum values keep coming back, so a field needs each of its values to have been seen this many times on average (and
+# enough values overall). A field with a few values that were each only seen a couple of times, like the names of the
+# players, could just as well be free text
+_MIN_ENUM_REPEATS = 4
+_MIN_ENUM_OCCURRENCES = 16
+
+
+# Distinct string values seen for a field, kept exactly until there's too many and estimated after that (HyperLogLog)
+# so memory use stays flat no matter how much free text a field has
+class ValueSketch:
+    __slots__ = ("values", "occurrences", "_registers")
+
+    def __init__(self) -> None:
+        self.values: set[str] = set()  # None once it's gone over _MAX_EXACT_VALUES
+        self.occurrences = 0  # Every value seen, repeats included
+        self._registers: bytearray = None
+
+    def add(self, val: str) -> None:
+        self.occurrences += 1
+        if self.values is not None:
+            self.values.add(val)
+            if len(self.values) > _MAX_EXACT_VALUES:
+                self._registers = bytearray(_SKETCH_REGISTERS)
+                for exact in self.values:
+                    self._add_hashed(exact)
+                self.values = None
+        else:
+            self._add_hashed(val)
+
+    # Hashed with blake2b rather than hash() so sketches from different processes (--jobs, the cache) can be merged
+    def _add_hashed(self, val: str) -> None:
+        hashed = int.from_bytes(hashlib.blake2b(val.encode(), digest_size=8).digest(), "little")
+        idx = hashed & (_SKETCH_REGISTERS - 1)
+        rank = 64 - _SKETCH_BITS - (hashed >> _SKETCH_BITS).bit_length() + 1
+        if rank > self._registers[idx]:
+            self._registers[idx] = rank
+
+    # Cached with the list of values, or the registers in base64 once it's only an estimate
+    def to_json(self) -> dict:
+        if self.values is not None:
+            return {"occurrences": self.occurrences, "values": sorted(self.values)}
+        return {"occurrences": self.occurrences, "registers": base64.b64encode(self._registers).decode()}
+
+    @classmethod
+    def from_json(cls, obj: dict) -> "ValueSketch":
+        sketch = cls()
+        sketch.occurrences = int(obj["occurrences"])
+        if "values" in obj:
+            sketch.values = {str(val) for val in obj["values"]}
+            return sketch
+        sketch.values = None
+        sketch._registers = bytearray(base64.b64decode(obj["registers"]))
+        if len(sketch._registers) != _SKETCH_REGISTERS:
+            raise ValueError("bad value sketch")
+        return sketch
+
+    def merge(self, other: "ValueSketch") -> None:
+        occurrences = self.occurrences + other.occurrences
+        if other.values is not None:
+            for val in other.values:
+                self.add(val)
+        elif self.values is not None:
+            exact = self.values
+            self.values = None
+            self._registers = bytearray(other._registers)
+            for val in exact:
+                self._add_hashed(val)
+        else:
+            self._registers = bytearray(map(max, self._registers, other._registers))
+        self.occurrences = occurrences
+
+    def count(self) -> int:
+        if self.values is not None:
+            return len(self.values)
+        estimate = 0.709 * _SKETCH_REGISTERS**2 / sum(2.0**-rank for rank in self._registers)
+        zeros = self._registers.count(0)
+        if estimate <= 2.5 * _SKETCH_REGISTERS and zeros > 0:  # Small range correction
+            estimate = _SKETCH_REGISTERS * math.log(_SKETCH_REGISTERS / zeros)
+        return round(estimate)
+
+    def is_enum_like(self) -> bool:
+        if self.values is None or len(self.values) < 2:
+            return False
+        if self.occurrences < max(_MIN_ENUM_OCCURRENCES, _MIN_ENUM_REPEATS * len(self.values)):
+            return False
+        if not all(len(val) == 0 or _ENUM_VALUE_PATTERN.fullmatch(val) for val in self.values):
+            return False
+
+        # Values that end up with the same member name (e.g. "draw-x" and "drawX"), or one that would clash with the
+        # None every enum starts with, would make an enum that doesn't compile
+        names = [_enum_member_name(val) for val in self.values if len(val) > 0]
+        return "None" not in names and len(set(names)) == len(names)
+
+
+def _track_strings(msg_data: dict, data: dict[str, ValueSketch]) -> None:
+    for key, val in msg_data.items():
+        val_type = type(val)
+        if val_type is str:
+            if (sketch := data.get(key)) is None:
+                sketch = data[sys.intern(key)] = ValueSketch()
+            sketch.add(val)
+        elif val_type is dict:
+            _track_strings(val, data)
+        elif val_type is list:  # Only objects in lists, a list of strings can't be an enum field
+            for entry in val:
+                if type(entry) is dict:
+                    _track_strings(entry, data)
+
+
+@dataclass
+class PathInfo:
+    types: int  # _TYPE_* flags
+    files: int  # Number of input files the path showed up in
+
+
+def _index_subfields(fields: SubfieldData, path: str, index: FieldIndex) -> None:
+    for name, field in fields.items():
+        field_path = f"{path}.{name}"
+        index.setdefault(name, {})[field_path] = PathInfo(field._types, 1)
+
+        # Entries of a list are all merged into one "entry" field
+        while field._value_types == _TYPE_LIST and "entry" in field._subdata:
+            field = field._subdata["entry"]
+            field_path += "[]"
+        _index_subfields(field._subdata, field_path, index)
+
+
+# Done once per input file (and cached along with it), merging adds up how many files each path was in
+def _index_fields(data: DataSet) -> None:
+    data.field_index = {}
+    _index_subfields(data.room_data, "room", data.field_index)
+    _index_subfields(data.player_data, "player", data.field_index)
+
+
+def _has_field(index: FieldIndex, name: str, root: str) -> bool:
+    return any(path.startswith(f"{root}.") for path in index.get(name, ()))
+
+
+# Combined types of every field with the same name, since enums are matched up with fields by name alone
+def _field_types(index: FieldIndex, name: str) -> int:
+    types = 0
+    for info in index.get(name, {}).values():
+        types |= info.types
+    return types
+
+
+# String fields with a handful of distinct values that could all be enum members
+def _detect_enums(data: DataSet) -> dict[str, set[str]]:
+    return {
+        name: sketch.values
+        for name, sketch in data.string_data.items()
+        if _field_types(data.field_index, name) & _VALUE_TYPES == _TYPE_STR and sketch.is_enum_like()
+    }
+
+
+def _output_template_files(game_name: str, src_folder_path: str, using_bc: bool, readers: bool = False) -> None:
     client_class = "BcSerializedClient" if using_bc else "PlayerSerializedClient"
+    model_reader = (
+        f"""
+    protected override IModelReader<{game_name}Room, {game_name}Player> ModelReader {{ get; }} = new {game_name}ModelReader();
+"""
+        if readers
+        else ""
+    )
 
     # Folder will always exist since it was created earlier
     client = Path(f"{src_folder_path}/Games/{game_name}/{game_name}Client.cs")
@@ -195,7 +620,7 @@ using Serilog;
 namespace JackboxGPT.Games.{game_name};
 
 public class {game_name}Client : {client_class}<{game_name}Room, {game_name}Player>
-{{
+{{{model_reader}
     public {game_name}Client(IConfigurationProvider configuration, ILogger logger, int instance)
         : base(configuration, logger, instance)
     {{
@@ -204,6 +629,9 @@ public class {game_name}Client : {client_class}<{game_name}Room, {game_name}Play
             )
     else:
         print(f"Skipping Client template creation as {game_name}Client.cs already exists")
+        # Existing clients don't get touched, so the reader would go unused unless it's hooked up by hand
+        if readers and f"{game_name}ModelReader" not in client.read_text(encoding="utf-8-sig"):
+            print(f"To use {game_name}ModelReader, add this to {game_name}Client:\n    {model_reader.strip()}")
 
     # If this folder doesn't exist something is wrong anyway
     engine = Path(f"{src_folder_path}/Engines/{game_name}Engine.cs")
@@ -248,13 +676,14 @@ public class {game_name}Engine : BaseJackboxEngine<{game_name}Client>
         print(f"Skipping Engine template creation as {game_name}Engine.cs already exists")
 
 
-def _handle_enum(file: TextIOWrapper, enum_data: dict[str, set[str]], enums_todo: list[str], indent: str) -> None:
-    def _getEnumTrueName(input: str) -> str:
-        if "-" not in input:
-            return _capitalize_first(input)
-        parts = input.split("-")
-        return "".join(_capitalize_first(part) for part in parts)
+def _enum_member_name(val: str) -> str:
+    if "-" not in val:
+        return _capitalize_first(val)
+    parts = val.split("-")
+    return "".join(_capitalize_first(part) for part in parts)
+
 
+def _handle_enum(file: TextIO, enum_data: dict[str, set[str]], enums_todo: list[str], indent: str) -> None:
     for name, vals in enum_data.items():
         if len(vals) == 0 or name not in enums_todo:
             continue
@@ -273,7 +702,7 @@ def _handle_enum(file: TextIOWrapper, enum_data: dict[str, set[str]], enums_todo
         for val in sorted(vals):
             if len(val) == 0:
                 continue
-            true_val = _getEnumTrueName(val)
+            true_val = _enum_member_name(val)
             prepend = f",\n{indent}"
             if "-" in val:  # Hyphens aren't allowed in enum names so this value needs a special serializer note
                 prepend = f'{prepend}[System.Runtime.Serialization.EnumMember(Value = "{val}")]\n{indent}'
@@ -281,36 +710,30 @@ def _handle_enum(file: TextIOWrapper, enum_data: dict[str, set[str]], enums_todo
         file.write("\n}\n")
 
 
-def _has_key_deep_check(data: SubfieldData, key: str) -> bool:
-    if data is None:
-        return False
-    if key in data:
-        return True
-    for element in data.values():
-        if _has_key_deep_check(element._subdata, key):
-            return True
-    return False
+def _model_header(game_name: str) -> str:
+    return f"""// This file was generated with jb_api_gen.py
+
+#nullable enable
+using System.Collections.Generic;
+using Newtonsoft.Json;
+using Newtonsoft.Json.Linq;
+
+namespace JackboxGPT.Games.{game_name}.Models;
+"""
 
 
 def _handle_file_output(
-    file: TextIOWrapper,
+    file: TextIO,
     base_name: str,
     struct_data: SubfieldData,
+    enum_data: dict[str, set[str]],
     enums_remaining: list[str],
     category: str,
     top_level: bool = False,
     indent: str = "    ",
+    field_index: FieldIndex = None,
 ) -> bool:
     class_name = f"{base_name}{category}" if top_level else base_name
-    standard_header = f"""// This file was generated with jb_api_gen.py
-
-#nullable enable
-using System.Collections.Generic;
-using Newtonsoft.Json;
-using Newtonsoft.Json.Linq;
-
-namespace JackboxGPT.Games.{base_name}.Models;
-"""
     empty_header = f"""// This file was generated with jb_api_gen.py
 
 namespace JackboxGPT.Games.{base_name}.Models;
@@ -328,14 +751,14 @@ public struct {class_name}
         # Determine which enums should be placed in this file
         enums_todo = []
         for idx in range(len(enums_remaining) - 1, -1, -1):
-            if _has_key_deep_check(struct_data, enums_remaining[idx]):
+            if _has_field(field_index, enums_remaining[idx], category.lower()):
                 enums_todo.append(enums_remaining.pop(idx))
 
         # Write header and enum blocks
-        file.write(standard_header)
-        _handle_enum(file, data.enum_data, enums_todo, indent)
+        file.write(_model_header(base_name))
+        _handle_enum(file, enum_data, enums_todo, indent)
 
-    enums = data.enum_data.keys()
+    enums = enum_data.keys()
     followups: list[tuple[str, SubfieldData]] = []
     file.write(f"\npublic struct {class_name}\n{{")
     for field in struct_data.values():
@@ -345,35 +768,287 @@ public struct {class_name}
     file.write("}\n")
 
     for name, field in followups:
-        _handle_file_output(file, name, field, [], name)
+        _handle_file_output(file, name, field, enum_data, [], name)
 
     return True
 
 
-def _output_as_cs(data: DataSet, game_name: str, src_folder_path: str, using_bc: bool) -> None:
-    # Create folder(s)
-    model_folder = Path(f"{src_folder_path}/Games/{game_name}/Models")
-    model_folder.mkdir(parents=True, exist_ok=True)
+# Files that already have the same contents are left alone, so their mtime doesn't change and .NET doesn't rebuild
+def _write_if_changed(path: Path, content: str) -> bool:
+    encoded = content.replace("\n", os.linesep).encode()
+    try:
+        with open(path, "rb") as file:
+            if hashlib.sha256(file.read()).digest() == hashlib.sha256(encoded).digest():
+                return False
+    except FileNotFoundError:
+        pass
+
+    # Written next to the final file and renamed over it, so a failed run never leaves half a file behind
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(temp_path, "wb") as file:
+            file.write(encoded)
+        os.replace(temp_path, path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return True
+
 
+# Contents of each generated file, by path from the src folder
+def _render_models(data: DataSet, game_name: str, readers: bool = False) -> tuple[dict[str, str], bool]:
     # Track which enums haven't been written yet
     enums_remaining = list(data.enum_data.keys())
 
-    # Write out Player file
-    with open(f"{model_folder}/{game_name}Player.cs", "w") as file:
-        wrote_out = _handle_file_output(file, game_name, data.player_data, enums_remaining, "Player", top_level=True)
+    # Player file
+    player = StringIO()
+    wrote_out = _handle_file_output(
+        player,
+        game_name,
+        data.player_data,
+        data.enum_data,
+        enums_remaining,
+        "Player",
+        top_level=True,
+        field_index=data.field_index,
+    )
+
+    # Room file
+    room = StringIO()
+    wrote_out |= _handle_file_output(
+        room,
+        game_name,
+        data.room_data,
+        data.enum_data,
+        enums_remaining,
+        "Room",
+        top_level=True,
+        field_index=data.field_index,
+    )
+
+    model_folder = f"Games/{game_name}/Models"
+    models = {
+        f"{model_folder}/{game_name}Player.cs": player.getvalue(),
+        f"{model_folder}/{game_name}Room.cs": room.getvalue(),
+    }
+
+    # Request structs can use the enums that were just written, but don't get any of their own
+    if len(data.send_data) > 0:
+        written_enums = {name: vals for name, vals in data.enum_data.items() if name not in enums_remaining}
+        models[f"{model_folder}/{game_name}Requests.cs"] = _render_requests(data, game_name, written_enums)
+
+    if readers:
+        models[f"{model_folder}/{game_name}ModelReader.cs"] = _render_reader(data, game_name)
+        models[f"../tests/Games/{game_name}ModelReaderTests.cs"] = _render_reader_tests(data, game_name)
+    return models, wrote_out
+
+
+_SEND_STRUCT_SUFFIXES = {"client/send": "Request", "text/update": "TextUpdate", "object/update": "ObjectUpdate"}
+
+
+def _render_requests(data: DataSet, game_name: str, enum_data: dict[str, set[str]]) -> str:
+    file = StringIO()
+    file.write(_model_header(game_name))
+    used_names = set()
+    for (opcode, name), sent in sorted(data.send_data.items()):
+        if opcode != "client/send" and len(sent.fields) == 0:
+            file.write(f'\n// Sent with {opcode} ("{name}"), its value isn\'t an object so there\'s no struct for it\n')
+            continue
+
+        # Prefixed with the game name (nested structs too) so they can't clash with request models that were written by
+        # hand. Groups like "choose-one" and "chooseOne" come out the same, so later ones get numbered
+        words = "".join(map(_capitalize_first, re.split(r"[^0-9A-Za-z]+", name)))
+        struct_name = f"{game_name}{words}{_SEND_STRUCT_SUFFIXES[opcode]}"
+        number = 1
+        while (unique_name := struct_name if number == 1 else f"{struct_name}{number}") in used_names:
+            number += 1
+        used_names.add(unique_name)
+
+        usage = "" if opcode == "client/send" else f', through ClientUpdate(req, "{name}")'
+        file.write(f'\n// Sent with {opcode} ("{name}"){usage}')
+        _handle_file_output(file, unique_name, sent.fields, enum_data, [], unique_name)
+    return file.getvalue()
+
+
+def _cs_literal(val: str) -> str:
+    return json.dumps(val)  # JSON string escapes are all valid in C# too
+
+
+# Expression reading a value of the given C# type from `reader`, which is already on the value's first token
+def _cs_read_expr(type_name: str, structs: set[str], reader: str = "reader") -> str:
+    if type_name.endswith("?"):
+        return f"{reader}.TokenType == JsonTokenType.Null ? null : {_cs_read_expr(type_name[:-1], structs, reader)}"
+    if type_name.startswith("List<"):
+        item_type = type_name[5:-1]
+        item = _cs_read_expr(item_type, structs, "item")
+        return f"ModelReading.ReadList<{item_type}>(ref {reader}, static (ref Utf8JsonReader item) => {item})"
+
+    match type_name:
+        case "string":
+            return f"{reader}.GetString()!"
+        case "int":
+            return f"{reader}.GetInt32()"
+        case "double":
+            return f"{reader}.GetDouble()"
+        case "bool":
+            return f"{reader}.GetBoolean()"
+        case "JRaw":
+            return f"ModelReading.ReadRaw(ref {reader})"
+    # Both structs and enums get their own Read method
+    structs.add(type_name)
+    return f"Read{type_name}(ref {reader})"
+
+
+# Same structs _handle_file_output writes, read from Utf8JsonReader one property at a time instead of by reflection
+def _render_reader(data: DataSet, game_name: str) -> str:
+    enum_names = data.enum_data.keys()
+    file = StringIO()
+    file.write(
+        f"""// This file was generated with jb_api_gen.py
+
+#nullable enable
+using System.Collections.Generic;
+using System.Text.Json;
+using JackboxGPT.Games.Common;
+using Newtonsoft.Json.Linq;
+
+namespace JackboxGPT.Games.{game_name}.Models;
+
+public sealed class {game_name}ModelReader : IModelReader<{game_name}Room, {game_name}Player>
+{{
+    public {game_name}Room ReadRoom(ref Utf8JsonReader reader) => Read{game_name}Room(ref reader);
+
+    public {game_name}Player ReadPlayer(ref Utf8JsonReader reader) => Read{game_name}Player(ref reader);
+"""
+    )
+
+    # Same order and naming as the model files, nested structs are named after the struct they're in
+    todo = [(f"{game_name}Player", data.player_data, "Player"), (f"{game_name}Room", data.room_data, "Room")]
+    types: set[str] = set()
+    while len(todo) > 0:
+        class_name, struct_data, specifier = todo.pop(0)
+        file.write(f"\n    private static {class_name} Read{class_name}(ref Utf8JsonReader reader)\n    {{\n")
+        file.write("        ModelReading.Expect(ref reader, JsonTokenType.StartObject);\n")
+        file.write(f"        var value = new {class_name}();\n")
+        file.write("        while (reader.Read() && reader.TokenType == JsonTokenType.PropertyName)\n        {\n")
+        branch = "if"
+        for field in struct_data.values():
+            type_name, _, (followup_name, followup_obj) = field.cs_typing(enum_names, specifier)
+            if followup_name is not None:
+                todo.append((followup_name, followup_obj, followup_name))
+            condition = f"reader.ValueTextEquals({_cs_literal(field._name)}u8) && reader.Read()"
+            file.write(f"            {branch} ({condition})\n")
+            file.write(f"                value.{_capitalize_first(field._name)} = {_cs_read_expr(type_name, types)};\n")
+            branch = "else if"
+        file.write(f"            {branch} (reader.Read())\n                reader.Skip();\n")
+        file.write("        }\n        return value;\n    }\n")
+
+    # Values from the logs get compared as bytes, anything else is left to the same name lookup Newtonsoft does
+    for name in sorted(name for name in enum_names if _capitalize_first(name) in types):
+        enum_type = _capitalize_first(name)
+        file.write(f"\n    private static {enum_type} Read{enum_type}(ref Utf8JsonReader reader)\n    {{\n")
+        file.write("        if (reader.TokenType == JsonTokenType.Number)\n")
+        file.write(f"            return ({enum_type})reader.GetInt32();\n")
+        for val in sorted(data.enum_data[name]):
+            file.write(f"        if (reader.ValueTextEquals({_cs_literal(val)}u8))\n")
+            file.write(f"            return {enum_type}.{_enum_member_name(val) if len(val) > 0 else 'None'};\n")
+        file.write(f"        return ModelReading.ReadEnumName<{enum_type}>(ref reader);\n    }}\n")
+    file.write("}\n")
+    return file.getvalue()
+
+
+def _cs_verbatim(val: str) -> str:
+    return '@"' + val.replace('"', '""') + '"'
 
-    # Write out Room file
-    with open(f"{model_folder}/{game_name}Room.cs", "w") as file:
-        wrote_out |= _handle_file_output(file, game_name, data.room_data, enums_remaining, "Room", top_level=True)
+
+# Round trip tests for the generated reader, using messages from the logs the models were made from
+def _render_reader_tests(data: DataSet, game_name: str) -> str:
+    file = StringIO()
+    file.write(
+        f"""// This file was generated with jb_api_gen.py
+
+using System.Text;
+using System.Text.Json;
+using FluentAssertions;
+using JackboxGPT.Games.{game_name}.Models;
+using Newtonsoft.Json;
+using Newtonsoft.Json.Linq;
+using NUnit.Framework;
+
+namespace Tests.Games
+{{
+    public class {game_name}ModelReaderTests
+    {{
+        private static readonly {game_name}ModelReader Reader = new();
+"""
+    )
+    for category, samples in (("Room", data.room_samples), ("Player", data.player_samples)):
+        if len(samples) == 0:
+            continue
+        model = f"{game_name}{category}"
+        file.write(f"\n        private static readonly string[] {category}Samples =\n        {{\n")
+        for sample in samples:
+            sample_json = json.dumps(sample, separators=(",", ":"), ensure_ascii=False)
+            file.write(f"            {_cs_verbatim(sample_json)},\n")
+        file.write(
+            f"""        }};
+
+        private static {model} Read{category}(string json)
+        {{
+            var reader = new Utf8JsonReader(Encoding.UTF8.GetBytes(json));
+            reader.Read();
+            return Reader.Read{category}(ref reader);
+        }}
+
+        // Has to come out the same as it does from Newtonsoft, and again after being written back out as JSON
+        [TestCaseSource(nameof({category}Samples))]
+        public void ShouldRead{category}LikeNewtonsoft(string json)
+        {{
+            var expected = JToken.Parse(JsonConvert.SerializeObject(JsonConvert.DeserializeObject<{model}>(json)));
+            var read = Read{category}(json);
+            var actual = JToken.Parse(JsonConvert.SerializeObject(read));
+            var reread = Read{category}(JsonConvert.SerializeObject(read));
+            var roundTrip = JToken.Parse(JsonConvert.SerializeObject(reread));
+
+            JToken.DeepEquals(actual, expected).Should().BeTrue($"{{actual}} should match {{expected}}");
+            JToken.DeepEquals(roundTrip, expected).Should().BeTrue($"{{roundTrip}} should match {{expected}}");
+        }}
+"""
+        )
+    file.write("    }\n}\n")
+    return file.getvalue()
+
+
+def _output_as_cs(
+    data: DataSet, game_name: str, src_folder_path: str, using_bc: bool, readers: bool = False
+) -> list[Path]:
+    # Everything is rendered before anything gets written
+    models, wrote_out = _render_models(data, game_name, readers)
+    changed = []
+    for name, content in models.items():
+        path = Path(src_folder_path) / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if _write_if_changed(path, content):
+            changed.append(path)
+            print(f"Updated {path.name}")
+        else:
+            print(f"{path.name} is unchanged")
 
     # Write out Client/Engine template files (if the previous steps seemed to work)
     if wrote_out:
-        _output_template_files(game_name, src_folder_path, using_bc)
+        _output_template_files(game_name, src_folder_path, using_bc, readers)
     else:
         print("Player and Room structures are both empty, please check input data")
+    return changed
 
 
 def _print_results(data: DataSet, verbose: bool = False) -> None:
+    if data.shape_lookups > 0:
+        print(
+            f"Message shape cache: {data.shape_hits}/{data.shape_lookups} player messages had an already seen"
+            f" layout ({100 * data.shape_hits / data.shape_lookups:.1f}%)"
+        )
+
     if verbose:
         print(f"\nRoom Fields:")
         for field in data.room_data.values():
@@ -387,172 +1062,1981 @@ def _print_results(data: DataSet, verbose: bool = False) -> None:
         for enum, val_set in data.enum_data.items():
             print(f"    {enum} values: {val_set}")
 
-    for entry in data.send_data:
-        print("\nSent = {")
-        for field in sorted(entry):
-            print(f"  {field}")
-        print("}")
-
-
-# This is a slow way to do this but whatever
-# For the record, this is here so that json can be extracted while ignoring
-# other logging artifacts (things like "[loader] load success" or "D_0e_jtX.js:12:238")
-def _transform_to_json(lines: list[str], required: str = None) -> list[dict]:
-    bracket_index: int = 0
-    cur_str: str = ""
-
-    def _sort_char(c: str) -> bool:
-        nonlocal bracket_index
-        nonlocal cur_str
-
-        if c == "{":
-            bracket_index += 1
-            cur_str += c
-        elif c == "}" and bracket_index > 0:
-            bracket_index -= 1
-            cur_str += c
-            return bracket_index == 0
-        elif bracket_index > 0:
-            cur_str += c
-        return False
+        if data.string_data is not None:
+            print("\nString Fields:")
+            for name, sketch in data.string_data.items():
+                distinct = f'{"" if sketch.values is not None else "~"}{sketch.count()}'
+                print(f"    {name} -> {distinct} distinct values in {sketch.occurrences:,}")
 
-    json_msgs: list[dict] = []
-    for line in lines:
-        for c in line:
-            if _sort_char(c):
-                try:
-                    msg = json.loads(cur_str)
-                    if required is None or required in msg:
-                        json_msgs.append(msg)
-                except ValueError:
-                    pass
-                finally:
-                    cur_str = ""
+    for (opcode, name), sent in sorted(data.send_data.items()):
+        print(f'\nSent {opcode} "{name}":')
+        for field in sent.fields.values():
+            field.print()
+
+
+def _peak_memory() -> int:
+    if resource is None:
+        return None
+    # ru_maxrss is in bytes on macOS and KiB everywhere else, worker processes (--jobs) count as children
+    scale = 1 if sys.platform == "darwin" else 1024
+    peaks = (resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+    return max(peaks) * scale
+
+
+def _format_counts(counts: Counter[str]) -> str:
+    return ", ".join(f"{name} {count:,}" for name, count in counts.most_common()) or "none"
+
+
+def _print_stats(stats: Stats, peak_memory: int) -> None:
+    mb = stats.scanned_bytes / (1 << 20)
+    print("\nStats:")
+    print(
+        f"    Input: {stats.files} files, {stats.input_bytes / (1 << 20):.1f} MB ({mb:.1f} MB uncompressed),"
+        f" {stats.messages:,} messages ({stats.skipped:,} skipped without decoding)"
+    )
+    # With --jobs these are added up across processes, so they can be more than the parse stage itself
+    print(f"    Read/extract: {stats.read_time:.2f} s ({mb / max(stats.read_time, 1e-9):.1f} MB/s)")
+    print(
+        f"    Message handling: {stats.handle_time:.2f} s"
+        f" ({stats.messages / max(stats.handle_time, 1e-9):,.0f} messages/s)"
+    )
+    print(f'    Stages: {", ".join(f"{name} {seconds:.2f} s" for name, seconds in stats.stages.items())}')
+    print(f"    Opcodes: {_format_counts(stats.opcodes)}")
+    print(f"    Object keys: {_format_counts(stats.object_keys)}")
+    print(f"    Unhandled: {_format_counts(stats.unhandled)}")
+    print(
+        f"    Discarded: {stats.scanned_bytes - stats.message_bytes:,} bytes outside messages,"
+        f" {stats.bad_candidates:,} broken objects, {stats.ignored_objects:,} objects that weren't messages"
+    )
+    for sample in stats.discarded:
+        print(f"        {sample!r}")
+    print(f"    Largest message: {stats.largest[0]:,} bytes ({stats.largest[1]})")
+    print(f"    Deepest field: {stats.deepest[1]} ({stats.deepest[0]} levels)")
+    print(f'    Peak memory: {"unknown" if peak_memory is None else f"{peak_memory / (1 << 20):.1f} MB"}')
+
+
+# Same numbers as _print_stats, for comparing runs between versions
+def _stats_report(stats: Stats, peak_memory: int) -> dict[str, Any]:
+    return {
+        **vars(stats),
+        "read_mb_per_s": stats.scanned_bytes / (1 << 20) / max(stats.read_time, 1e-9),
+        "messages_per_s": stats.messages / max(stats.handle_time, 1e-9),
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+# Offsets where a JSON object could start, an opening brace followed by a key or the closing brace
+_CANDIDATE_PATTERN = re.compile(rb'\{\s*["}]')
+# Skips ahead to the next brace that isn't inside a string, a lone quote means a string ran past the end of its line
+# (or of the data)
+_BRACE_PATTERN = re.compile(rb'[^{}"]*(?:"[^"\\\n]*(?:\\.[^"\\\n]*)*"[^{}"]*)*([{}"])')
+_STRING_PATTERN = re.compile(rb'"[^"\\\n]*(?:\\.[^"\\\n]*)*"')
+# The start of a line holding a message, either all of it or just the opening brace when it's pretty-printed
+_MESSAGE_LINE_PATTERN = re.compile(rb'[^\n{"]*\{[ \t]*(?:"[^\n]*"opcode"|\r?\n[ \t]*"(?:pc|seq|opcode)")')
+_JSON_DECODER = json.JSONDecoder()
+_MAX_MESSAGE_SIZE = 64 << 20
+_MAX_LINE_SIZE = 1 << 20
+_CHUNK_SIZE = 1 << 20
+_MMAP_WINDOW = 4 << 20
+
+
+def _open_zstd(path: str, mode: str) -> BinaryIO:
+    return zstandard.ZstdDecompressor().stream_reader(open(path, mode), read_across_frames=True, closefd=True)
+
+
+# Compressed input is decompressed a chunk at a time as it gets scanned, never all at once
+_DECOMPRESSORS: dict[str, Callable[[str, str], BinaryIO]] = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+    ".xz": lzma.open,
+    ".zst": _open_zstd,
+}
+_INPUT_EXTENSIONS = (".txt", ".json", ".har")
+
+
+def _is_compressed(path: str) -> bool:
+    return os.path.splitext(path)[1] in _DECOMPRESSORS
+
+
+# Name of the file once it's decompressed, e.g. "log.txt.gz" -> "log.txt"
+def _uncompressed_name(path: str) -> str:
+    return os.path.splitext(path)[0] if _is_compressed(path) else path
+
+
+def _read_chunks(path: str, chunk_size: int = _CHUNK_SIZE) -> Iterator[bytes]:
+    with _DECOMPRESSORS.get(os.path.splitext(path)[1], open)(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            yield chunk
+
+
+# Returns the offset just past the end of the object starting at start, or -1 if limit was reached first, along with
+# where the scan stopped. With messages set it also stops at the next line holding a message, so a message that got cut
+# off isn't scanned all the way to limit
+def _find_object_end(buf: bytes, start: int, limit: int, messages: bool = False) -> tuple[int, int]:
+    depth = 0
+    pos = start
+    while (brace := _BRACE_PATTERN.match(buf, pos, limit)) is not None:
+        match brace.group(1):
+            case b"{":
+                if messages and depth > 0 and (line := buf.rfind(b"\n", pos, brace.end())) != -1:
+                    if _MESSAGE_LINE_PATTERN.match(buf, line + 1, limit) is not None:
+                        return -1, line + 1
+                depth += 1
+            case b"}":
+                depth -= 1
+                if depth == 0:
+                    return brace.end(), brace.end()
+            case _:
+                # Running out of data can also backtrack to a quote starting a string that's fine
+                if _STRING_PATTERN.match(buf, brace.end() - 1, limit) is None:
+                    if (line := buf.find(b"\n", brace.end(), limit)) != -1:
+                        return -1, line + 1
+                return -1, limit
+        pos = brace.end()
+    return -1, limit
+
+
+def _decode_prefix(buf: bytes, start: int, end: int) -> tuple[dict, int]:
+    try:
+        text = buf[start:end].decode()
+        msg, idx = _JSON_DECODER.raw_decode(text)
+    except ValueError:
+        return None, -1
+    # Byte offsets only line up with string offsets when everything is ASCII
+    return msg, start + (idx if text.isascii() else len(text[:idx].encode()))
+
+
+def _decode_object(buf: bytes, start: int, limit: int) -> tuple[dict, int]:
+    # Most messages run to the end of their line, so try decoding that before scanning for the closing brace
+    line_limit = min(limit, start + _MAX_LINE_SIZE)
+    line_end = buf.find(b"\n", start, line_limit)
+    if line_end == -1 and line_limit == len(buf):
+        line_end = line_limit
+    if line_end != -1 and (close := buf.rfind(b"}", start, line_end)) != -1:
+        if (decoded := _decode_prefix(buf, start, close + 1))[0] is not None:
+            return decoded
+
+    end, stopped = _find_object_end(buf, start, limit, messages=True)
+    if end == -1:
+        return None, -1 if stopped == limit else stopped
+    if (decoded := _decode_prefix(buf, start, end))[0] is not None:
+        return decoded
+    return None, start + 1  # Objects inside this one could still be fine
+
+
+# Messages that can be dropped without decoding them, because nothing would be done with them anyway
+@dataclass(frozen=True)
+class MessageFilter:
+    # Finds the same candidates as _CANDIDATE_PATTERN, except that messages with one of the dropped opcodes (group 1)
+    # or object messages (key in group 2) are matched up to the last closing brace on their line
+    candidates: re.Pattern[bytes]
+    # Enum values are taken from every object message, so ignored object keys only get dropped without these in them
+    enum_fields: re.Pattern[bytes] | None
+
+
+# Only messages with their opcode first (or right after "pc"/"seq") are matched, so it's sure to be at the top level,
+# and the result has to come right after it for the key to be found. Messages are always laid out this way.
+# Room/player keys are ruled out by the pattern itself, so those messages go straight to being decoded
+def _message_filter(enum_names: Iterable[str]) -> MessageFilter:
+    dropped = [re.escape(opcode.encode()) for opcode, handler in _OPCODE_HANDLERS.items() if handler is None]
+    tracked = [re.escape(key.encode()) + b'"' for key in _ROOM_KEYS]
+    tracked += [re.escape(prefix.encode()) for prefix in _PLAYER_KEY_PREFIXES]
+    # The brace is kept out in front so the search can still skip straight to them
+    candidates = re.compile(
+        rb'\{(?:\s*(?:"[^"\\]*"\s*:\s*-?\d+\s*,\s*)?"opcode"\s*:\s*"(?:(' + b"|".join(dropped) + rb')"'
+        rb'|object"\s*,\s*"result"\s*:\s*\{\s*"key"\s*:\s*"(?!' + b"|".join(tracked) + rb')([^"\\]*)")'
+        rb'[^\n]*\}|\s*["}])'
+    )
+    markers = [re.escape(json.dumps(name).encode()) for name in enum_names]
+    return MessageFilter(candidates, re.compile(b"|".join(markers)) if len(markers) > 0 else None)
+
+
+# Same guess as _decode_object makes, that the message runs to the end of its line. It's only trusted when the line is
+# complete, the braces up to there add up and there's no other message in it, otherwise it's decoded instead.
+# Returns the opcode and key (for object messages) of a candidate found by skip.candidates, if it can be dropped
+def _skip_message(buf: bytes, candidate: re.Match, limit: int, skip: MessageFilter) -> tuple[str, str | None] | None:
+    end = candidate.end()
+    if end - candidate.start() > _MAX_LINE_SIZE or buf.find(b"\n", end, limit) == -1:
+        return None
+    text = candidate[0]
+    if text.count(b"{") != text.count(b"}") or text.count(b'"opcode"') != 1:
+        return None
+    if candidate[1] is not None:
+        return candidate[1].decode(), None
+    key = candidate[2].decode()
+    if not _is_ignored_object_key(key) or (skip.enum_fields is not None and skip.enum_fields.search(text)):
+        return None
+    return "object", key
+
+
+# Works on any bytes-like buffer, only the slices holding candidate messages are ever decoded
+# Objects have to start before stop, but can extend past it. Returns where extraction should resume from
+def _extract_json(
+    buf: bytes,
+    pos: int,
+    stop: int,
+    final: bool,
+    required: str = None,
+    stats: Stats = None,
+    skip: MessageFilter = None,
+) -> Generator[dict, None, int]:
+    size = len(buf)
+    sampled_until = pos  # Only used for stats, so the rest of a broken object doesn't show up twice
+    candidates = _CANDIDATE_PATTERN if skip is None else skip.candidates
+    while (candidate := candidates.search(buf, pos)) is not None:
+        start = candidate.start()
+        if start >= stop:
+            return start
+
+        limit = min(size, start + _MAX_MESSAGE_SIZE)
+        if candidate.lastindex is not None and (skipped := _skip_message(buf, candidate, limit, skip)) is not None:
+            if stats is not None:
+                stats.add_discarded(buf, max(pos, sampled_until), start)
+                stats.add_skipped(candidate.end() - start, *skipped)
+            pos = candidate.end()
+            continue
+
+        msg, end = _decode_object(buf, start, limit)
+        if msg is None:
+            # Ran out of data partway through the object, wait for the next chunk
+            if end == -1 and limit == size and not final:
+                return start
+            if stats is not None:
+                stats.bad_candidates += 1
+                line_end = buf.find(b"\n", start, limit)
+                sampled_until = limit if line_end == -1 else line_end
+                stats.add_discarded(buf, start, sampled_until)
+            # The scan for its end stops at the next message, so nothing it went past needs to be looked at again
+            pos = limit if end == -1 else end
+            continue
 
-    return json_msgs
+        if stats is not None:
+            stats.add_discarded(buf, max(pos, sampled_until), start)
+        pos = end
+        if required is None or required in msg:
+            if stats is not None:
+                stats.message_bytes += end - start
+                if end - start > stats.largest[0]:
+                    stats.largest = (end - start, _describe_message(msg))
+            yield msg
+        elif stats is not None:
+            stats.ignored_objects += 1
+
+    # Hold on to a trailing brace in case its object continues in the next chunk
+    if not final and (tail := buf.rfind(b"{", pos)) != -1:
+        return tail
+    return size
+
+
+# Objects from a HAR capture that could be WebSocket frames, their data holds the actual message as a string
+_HAR_FRAME_PATTERN = re.compile(rb'\{\s*"(?:type|time|opcode|data)"\s*:')
+# Frames in _webSocketMessages are tagged with one of these, sent from the browser or received from the server
+_HAR_FRAME_TYPES = {"send": True, "receive": False}
+
+
+# Same as _extract_json, but yields the WebSocket frames in a HAR capture instead of the messages inside them
+# Frames get found wherever they are, so none of the rest of the HAR structure has to be parsed (or held in memory)
+def _extract_har_frames(buf: bytes, pos: int, stop: int, final: bool) -> Generator[dict, None, int]:
+    size = len(buf)
+    while (candidate := _HAR_FRAME_PATTERN.search(buf, pos)) is not None:
+        start = candidate.start()
+        if start >= stop:
+            return start
+
+        # HAR files are often one huge line, so skip the line based guess _decode_object makes
+        limit = min(size, start + _MAX_MESSAGE_SIZE)
+        end = _find_object_end(buf, start, limit)[0]
+        if end == -1:
+            if limit == size and not final:
+                return start
+            pos = start + 1
+            continue
+
+        frame = _decode_prefix(buf, start, end)[0]
+        if frame is None or frame.get("type") not in _HAR_FRAME_TYPES or type(frame.get("data")) is not str:
+            pos = start + 1  # Some other object that happens to start the same way, frames could still be inside it
+            continue
+
+        pos = end
+        yield frame
 
+    if not final and (tail := buf.rfind(b"{", pos)) != -1:
+        return tail
+    return size
+
+
+Extractor = Callable[[bytes, int, int, bool], Generator[dict, None, int]]
+
+
+# Objects are yielded as soon as they're complete, for input that can only be read front to back
+def _scan_chunks(chunks: Iterable[bytes], extract: Extractor) -> Iterator[dict]:
+    buf = bytearray()
+    wanted: int = 0
+    for chunk in chunks:
+        buf += chunk
+        if len(buf) < wanted:  # Large message still incomplete, avoid rescanning it for every chunk
+            continue
+        pos = yield from extract(buf, 0, len(buf), False)
+        del buf[:pos]
+        wanted = 2 * len(buf)
+
+    yield from extract(buf, 0, len(buf), True)
+
+
+def _count_chunks(chunks: Iterable[bytes], stats: Stats) -> Iterator[bytes]:
+    for chunk in chunks:
+        stats.scanned_bytes += len(chunk)
+        yield chunk
+
+
+# Input files are memory mapped and scanned in place, so memory use doesn't depend on file size
+def _scan_file(path: str, extract: Extractor, stats: Stats = None) -> Iterator[dict]:
+    if _is_compressed(path):
+        chunks = _read_chunks(path)
+        yield from _scan_chunks(chunks if stats is None else _count_chunks(chunks, stats), extract)
+        return
+
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        try:
+            buf = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else None
+        except (OSError, ValueError):  # Not something that can be mapped (e.g. a pipe), read it normally instead
+            buf = None
+        if buf is None:
+            chunks = _read_chunks(path)
+            yield from _scan_chunks(chunks if stats is None else _count_chunks(chunks, stats), extract)
+            return
+        if stats is not None:
+            stats.scanned_bytes += size
+
+        with buf:
+            yield from _scan_mapped(buf, 0, size, extract)
+
+
+# Objects have to start before end, but can run past it. Returns where extraction would carry on from after that
+def _scan_mapped(buf: mmap.mmap, start: int, end: int, extract: Extractor) -> Generator[dict, None, int]:
+    if hasattr(mmap, "MADV_SEQUENTIAL"):
+        buf.madvise(mmap.MADV_SEQUENTIAL)
+    pos = start
+    while pos < end:
+        pos = yield from extract(buf, pos, min(pos + _MMAP_WINDOW, end), True)
+        # Let go of pages that have already been scanned, otherwise they stay resident until the end
+        if hasattr(mmap, "MADV_DONTNEED"):
+            buf.madvise(mmap.MADV_DONTNEED, 0, pos - pos % mmap.PAGESIZE)
+    return pos
+
+
+# This is here so that json can be extracted while ignoring other logging artifacts
+# (things like "[loader] load success" or "D_0e_jtX.js:12:238")
+def _transform_to_json(chunks: Iterable[bytes], required: str = None, skip: MessageFilter = None) -> Iterator[dict]:
+    return _scan_chunks(chunks, partial(_extract_json, required=required, skip=skip))
+
+
+def _iter_file_json(
+    path: str, required: str = None, stats: Stats = None, skip: MessageFilter = None
+) -> Iterator[dict]:
+    return _scan_file(path, partial(_extract_json, required=required, stats=stats, skip=skip), stats)
+
+
+# The Jackbox message in a frame, or None if there isn't one (or skip drops it)
+def _decode_har_frame(frame: dict, stats: Stats = None, skip: MessageFilter = None) -> dict | None:
+    if frame.get("opcode", 1) != 1:  # Binary frames are base64, and not something Jackbox sends
+        return None
+    # Only received messages, sent ones still get decoded so the check for which way they went is done
+    if skip is not None and not _HAR_FRAME_TYPES[frame["type"]]:
+        # Frames only hold the one message, so it can be treated like a line of a log
+        text = frame["data"].encode(errors="surrogatepass") + b"\n"
+        candidate = skip.candidates.match(text)
+        if candidate is not None and candidate.lastindex is not None:
+            if (skipped := _skip_message(text, candidate, len(text), skip)) is not None:
+                if stats is not None:
+                    stats.add_skipped(len(frame["data"]), *skipped)
+                return None
+    try:
+        msg = json.loads(frame["data"])
+    except ValueError:
+        if stats is not None:
+            stats.bad_candidates += 1
+            sample = frame["data"][: _STATS_SAMPLE_SIZE].encode()
+            stats.add_discarded(sample, 0, len(sample))
+        return None
+    if type(msg) is not dict or "opcode" not in msg:
+        if stats is not None:
+            stats.ignored_objects += 1
+        return None
+
+    if stats is not None:
+        stats.message_bytes += len(frame["data"])
+        if len(frame["data"]) > stats.largest[0]:
+            stats.largest = (len(frame["data"]), _describe_message(msg))
+    return msg
+
+
+# Yields whether each message was sent by the browser, along with the message itself
+def _iter_har_messages(path: str, stats: Stats = None, skip: MessageFilter = None) -> Iterator[tuple[bool, dict]]:
+    for frame in _scan_file(path, _extract_har_frames, stats):
+        if (msg := _decode_har_frame(frame, stats, skip)) is not None:
+            yield _HAR_FRAME_TYPES[frame["type"]], msg
+
+
+def _describe_message(msg: dict) -> str:
+    result = msg.get("result")
+    if type(result) is dict and type(result.get("key")) is str:
+        return f'{msg.get("opcode")} {_group_object_key(result["key"])}'
+    return str(msg.get("opcode"))
+
+
+# Object keys often end with an ID (e.g. "bc:customer:<ID>"), group those together
+def _group_object_key(key: str) -> str:
+    prefix, _, _ = key.rpartition(":")
+    return f"{prefix}:*" if len(prefix) > 0 and key != "bc:room" else key
+
+
+# Found from the merged fields rather than from each message, which would cost more than handling the message does
+def _deepest_field(fields: SubfieldData, path: str) -> tuple[int, str]:
+    deepest = (0, path)
+    for name, field in fields.items():
+        depth, field_path = _deepest_field(field._subdata, f"{path}.{name}")
+        if depth + 1 > deepest[0]:
+            deepest = (depth + 1, field_path)
+    return deepest
+
+
+# Keeps memory use bounded for input where nearly every message is laid out differently
+_MAX_MESSAGE_SHAPES = 4096
+# Room messages of each file that get looked at for reader test samples
+_MAX_SAMPLE_CHECKS = 4096
+
+
+# Returns whether a message with the same layout had already been merged, in which case only its objects/lists are
+# walked since the rest can't add anything new
+def _track_receive_data(msg_data: dict, data: SubfieldData, shapes: MessageShapes = None) -> bool:
+    if shapes is not None:
+        shape = (tuple(msg_data), tuple(map(type, msg_data.values())))
+        if (nested := shapes.get(shape)) is not None:
+            for field_name in nested:
+                data[field_name].update(msg_data[field_name])
+            return True
 
-def _track_receive_data(msg_data: dict, data: SubfieldData) -> None:
     for field_name, field_val in msg_data.items():
         if field_name not in data:
             data[field_name] = FieldData(field_name)
         data[field_name].update(field_val)
 
+    if shapes is not None and len(shapes) < _MAX_MESSAGE_SHAPES:
+        shapes[shape] = tuple(key for key, val in msg_data.items() if type(val) is dict or type(val) is list)
+    return False
 
-def _track_send_data(msg_data: dict[str, Any], data: set[frozenset[str]], enum_keys: list[str]) -> None:
-    def _get_val_rep(key: str, val: Any) -> str:
-        # Enum Keyed Field
-        if key in enum_keys:
-            try:
-                # Prefixed Key
-                return f'"{key}": "{val[:val.index(":")+1]}<ID>"'
-            except ValueError:
-                # Non-Prefixed Key
-                return f'"{key}": "{val}"'
 
-        # Non-Key Multi-Field
-        if type(val) == dict:
-            str_rep = f'"{key}": {{\n'
-            for subkey, subval in val.items():
-                str_rep += f"    {_get_val_rep(subkey, subval)}\n"
-            str_rep += "  }"
-            return str_rep
+# Outgoing messages are grouped by their action, or the key they update without its ID (entertext:5 -> entertext)
+def _send_group_name(msg_data: dict) -> str:
+    if type(action := msg_data.get("action")) is str:
+        return action
+    if type(key := msg_data.get("key")) is str:
+        return key.partition(":")[0]
+    return next(iter(msg_data), "")
+
 
-        # Non-Key Single-Field
-        return f'"{key}": <{type(val).__name__}>'
+# Outgoing messages end up in the same kind of field tree as received ones. They only have a couple of fields, so
+# they skip the shape cache: working out their layout takes longer than merging them
+def _track_send_data(data: DataSet, group: tuple[str, str], msg_data: dict | None) -> None:
+    if (sent := data.send_data.get(group)) is None:
+        sent = data.send_data[group] = SentMessages()
+    if msg_data is not None:
+        _track_receive_data(msg_data, sent.fields)
 
-    data.add(frozenset(_get_val_rep(field_name, field_val) for field_name, field_val in msg_data.items()))
 
+# Player messages are mostly flat, so on a hit only one or two of their fields still need merging
+def _track_player_data(data: DataSet, msg_data: dict) -> None:
+    data.shape_lookups += 1
+    if _track_receive_data(msg_data, data.player_data, data.player_shapes):
+        data.shape_hits += 1
+    elif len(data.player_samples) < _MAX_SAMPLES:
+        data.player_samples.append(msg_data)
 
-def _sort_object_by_key(data: DataSet, key: str) -> bool:
-    # Handle prefix keys
-    if key == "bc:room" or key == "room":
-        _track_receive_data(msg["result"]["val"], data.room_data)
+
+# Room messages are mostly objects and lists, which get walked either way, so the shape cache doesn't save anything
+# for them. Their layouts are only worked out to pick samples, for the first messages of each file
+def _track_room_data(data: DataSet, msg_data: dict) -> None:
+    _track_receive_data(msg_data, data.room_data)
+    if len(data.room_samples) < _MAX_SAMPLES and data.room_checks < _MAX_SAMPLE_CHECKS:
+        data.room_checks += 1
+        shape = (tuple(msg_data), tuple(map(type, msg_data.values())))
+        if shape not in data.room_shapes:
+            data.room_shapes[shape] = ()
+            data.room_samples.append(msg_data)
+
+
+# Keys of object messages that are known to not be needed, any other key without a room/player prefix gets a warning
+_IGNORED_OBJECT_KEYS = {"textDescriptions", "connectedPlayers", "roundInfo", "horseRaceInfo"}
+_ROOM_KEYS = ("bc:room", "room")
+_PLAYER_KEY_PREFIXES = ("bc:customer:", "player:")
+
+
+def _is_room_key(key: str) -> bool:
+    return key in _ROOM_KEYS
+
+
+def _is_player_key(key: str) -> bool:
+    return key.startswith(_PLAYER_KEY_PREFIXES)
+
+
+# Newer games have lots of action:<ID> messages, but they're not needed as far as I've seen
+def _is_ignored_object_key(key: str) -> bool:
+    return not _is_room_key(key) and not _is_player_key(key) and (":" in key or key in _IGNORED_OBJECT_KEYS)
+
+
+def _sort_object_by_key(data: DataSet, msg: dict) -> bool:
+    key = msg["result"]["key"]
+
+    if _is_room_key(key):
+        _track_room_data(data, msg["result"]["val"])
         return True
-    elif key.startswith("bc:customer:") or key.startswith("player:"):
-        _track_receive_data(msg["result"]["val"], data.player_data)
+    elif _is_player_key(key):
+        _track_player_data(data, msg["result"]["val"])
         return True
-    elif ":" in key:  # Newer games have lots of action:<ID> messages, but they're not needed as far as I've seen
-        return False
+    elif not _is_ignored_object_key(key):
+        print(f"WARNING: Unhandled object key {key}")
+        if data.stats is not None:
+            data.stats.unhandled[f"object key {key}"] += 1
 
-    # Handle standard keys
-    match key:
-        case "textDescriptions":
-            pass
-        case "connectedPlayers":
-            pass
-        case "roundInfo":
-            pass
-        case "horseRaceInfo":
+    return False
+
+
+def _handle_object(data: DataSet, msg: dict) -> None:
+    # Determine what kind of messages are being exchanged
+    tracked = _sort_object_by_key(data, msg)
+    if tracked and data.using_bc is None:
+        data.using_bc = msg["result"]["key"].startswith("bc:")
+
+    # Keep track of enum values, these are taken from every object message (not just the tracked ones)
+    val = msg["result"]["val"]
+    if type(val) == dict:
+        for key in data.enum_data.keys():
+            if key in val and type(val[key]) == str:
+                data.enum_data[key].add(val[key])
+        if tracked and data.string_data is not None:
+            _track_strings(val, data.string_data)
+
+
+def _handle_client_send(data: DataSet, msg: dict) -> None:
+    body = msg["params"]["body"]
+    _track_send_data(data, ("client/send", _send_group_name(body)), body)
+
+
+# Only the value gets a struct, ClientUpdate puts the key (with the player ID) around it. Text updates are just a string
+def _handle_update(data: DataSet, msg: dict) -> None:
+    params = msg["params"]
+    group = (msg["opcode"], _send_group_name(params))
+    _track_send_data(data, group, params["val"] if type(params.get("val")) is dict else None)
+
+
+# What's done with the messages of each opcode, None for the ones that have nothing needed in them. These never get
+# decoded at all when they can be told apart without it, see _message_filter
+_OPCODE_HANDLERS: dict[str, Callable[[DataSet, dict], None] | None] = {
+    "object": _handle_object,
+    "client/send": _handle_client_send,
+    "text/update": _handle_update,
+    "object/update": _handle_update,
+    "client/welcome": None,
+    "room/lock": None,
+    "room/exit": None,
+    "ok": None,
+    "text": None,
+    "drop": None,
+}
+
+# Opcodes for messages going from the browser to the server, everything else is received
+_SENT_OPCODES = {"client/send", "text/update", "object/update"}
+
+
+# sent is only known for captures that keep track of it (HAR), otherwise the opcode is all there is to go on
+def _handle_message(data: DataSet, msg: dict, sent: bool = None) -> None:
+    if sent is not None and sent != (msg["opcode"] in _SENT_OPCODES):
+        print(f'WARNING: Unexpected {"sent" if sent else "received"} {msg["opcode"]} message')
+        if data.stats is not None:
+            data.stats.unhandled[f'{"sent" if sent else "received"} opcode {msg["opcode"]}'] += 1
+        return
+
+    opcode = msg["opcode"]
+    if type(opcode) is not str or opcode not in _OPCODE_HANDLERS:
+        print(f"WARNING: Unhandled opcode key {opcode}")
+        if data.stats is not None:
+            data.stats.unhandled[f"opcode {opcode}"] += 1
+    elif (handler := _OPCODE_HANDLERS[opcode]) is not None:
+        handler(data, msg)
+
+
+# Each input file is handled separately so that they can be spread across processes
+def _ingest_file(path: str, enum_names: list[str], auto_enums: bool, collect_stats: bool) -> DataSet:
+    data = _new_file_data(enum_names, auto_enums, collect_stats)
+    skip = _message_filter(enum_names)
+    if _uncompressed_name(path).endswith(".har"):
+        messages = _iter_har_messages(path, data.stats, skip)
+    else:
+        messages = zip(repeat(None), _iter_file_json(path, "opcode", data.stats, skip))
+
+    _ingest_messages(data, messages)
+    _finish_file_data(data, path)
+    return data
+
+
+def _new_file_data(enum_names: list[str], auto_enums: bool, collect_stats: bool) -> DataSet:
+    return DataSet(
+        enum_data={name: set() for name in enum_names},
+        string_data={} if auto_enums else None,
+        stats=Stats() if collect_stats else None,
+    )
+
+
+def _ingest_messages(data: DataSet, messages: Iterator[tuple[bool, dict]]) -> None:
+    if data.stats is None:
+        for sent, msg in messages:
+            _handle_message(data, msg, sent)
+    else:
+        _ingest_messages_with_stats(data, messages, data.stats)
+
+
+# No point keeping (or caching) these once the input they were for is done
+def _clear_shapes(data: DataSet) -> None:
+    data.room_shapes.clear()
+    data.player_shapes.clear()
+    data.room_checks = 0
+
+
+def _finish_file_data(data: DataSet, path: str) -> None:
+    if data.stats is not None:
+        data.stats.files = 1
+        data.stats.input_bytes = os.path.getsize(path)
+    _clear_shapes(data)
+    _index_fields(data)
+
+
+# One of the byte ranges a large log gets split into (see _split_file). Along with the data, returns where the first
+# object at or after start is and where extraction would carry on from after end, so ranges can be lined up
+def _ingest_range(
+    path: str, start: int, end: int, enum_names: list[str], auto_enums: bool, collect_stats: bool
+) -> tuple[DataSet, int, int]:
+    data = _new_file_data(enum_names, auto_enums, collect_stats)
+    extract = partial(_extract_json, required="opcode", stats=data.stats, skip=_message_filter(enum_names))
+    resume = start
+
+    def scan(buf: mmap.mmap) -> Iterator[dict]:
+        nonlocal resume
+        resume = yield from _scan_mapped(buf, start, end, extract)
+
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        first = candidate.start() if (candidate := _CANDIDATE_PATTERN.search(buf, start)) is not None else len(buf)
+        _ingest_messages(data, zip(repeat(None), scan(buf)))
+    _clear_shapes(data)
+    return data, first, resume
+
+
+# Plain text logs get read in ranges of about this size, which can go to different processes with --jobs. The size
+# doesn't depend on the number of processes, so the output (e.g. the samples picked for --readers) doesn't either
+_RANGE_SIZE = 32 << 20
+# Ranges are split right before a line with a whole message on it (after whatever the console put in front of it)
+_RANGE_START_PATTERN = re.compile(rb'\n[^\n{]*\{[ \t]*"[^\n]*"opcode"')
+
+
+# Byte ranges that a log can be read in separately, just the whole file if it's small or can't be split
+def _split_file(path: str) -> list[tuple[int, int]]:
+    size = os.path.getsize(path)
+    parts = size // _RANGE_SIZE
+    if parts <= 1 or _is_compressed(path) or path.endswith(".har"):
+        return [(0, size)]
+
+    starts = [0]
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        for part in range(1, parts):
+            line = _RANGE_START_PATTERN.search(buf, max(starts[-1], part * size // parts))
+            if line is None:
+                break
+            if line.start() + 1 > starts[-1]:
+                starts.append(line.start() + 1)
+    return list(zip(starts, [*starts[1:], size]))
+
+
+# Ranges are put back together in order. A message can run past the end of its range when a split turns out to be in
+# the middle of one (e.g. in a multi-line message), then the next range started in the wrong place and gets read again
+# from where the message really ended, the same as reading the whole file in one go would have
+def _merge_ranges(
+    path: str,
+    enum_names: list[str],
+    auto_enums: bool,
+    ranges: list[tuple[int, int]],
+    parts: list[tuple[DataSet, int, int]],
+) -> DataSet:
+    data, _, resume = parts[0]
+    for (_, end), (part, first, part_resume) in zip(ranges[1:], parts[1:]):
+        if first != resume:
+            part, _, part_resume = _ingest_range(path, resume, end, enum_names, auto_enums, data.stats is not None)
+        data.merge(part)
+        resume = part_resume
+
+    _finish_file_data(data, path)
+    if data.stats is not None:
+        data.stats.scanned_bytes = data.stats.input_bytes
+    return data
+
+
+# Same as the loop in _ingest_file, but keeping track of where the time goes
+def _ingest_messages_with_stats(data: DataSet, messages: Iterator[tuple[bool, dict]], stats: Stats) -> None:
+    last = time.perf_counter()
+    for sent, msg in messages:
+        start = time.perf_counter()
+        _handle_message(data, msg, sent)
+        end = time.perf_counter()
+        stats.read_time += start - last
+        stats.handle_time += end - start
+
+        stats.messages += 1
+        stats.opcodes[msg["opcode"]] += 1
+        if msg["opcode"] == "object" and type(msg.get("result")) is dict:
+            stats.object_keys[_group_object_key(msg["result"]["key"])] += 1
+        last = time.perf_counter()
+    stats.read_time += time.perf_counter() - last
+
+
+def _ingest_part(
+    path: str, span: tuple[int, int] | None, enum_names: list[str], auto_enums: bool, collect_stats: bool
+) -> DataSet | tuple[DataSet, int, int]:
+    if span is None:
+        return _ingest_file(path, enum_names, auto_enums, collect_stats)
+    return _ingest_range(path, *span, enum_names, auto_enums, collect_stats)
+
+
+# Each task is (path, enum_names, auto_enums), so files from several games can share one process pool.
+# Big logs are split into ranges that go through the pool on their own, so one huge file still uses every process
+def _parse_files(tasks: list[tuple[str, list[str], bool]], collect_stats: bool, jobs: int) -> list[DataSet]:
+    splits = [_split_file(path) for path, _, _ in tasks]
+    parts = [(idx, span if len(split) > 1 else None) for idx, split in enumerate(splits) for span in split]
+    results: dict[tuple[int, tuple[int, int] | None], DataSet | tuple[DataSet, int, int]] = {}
+    if jobs <= 1 or len(parts) <= 1:
+        for idx, span in parts:
+            results[idx, span] = _ingest_part(tasks[idx][0], span, *tasks[idx][1:], collect_stats)
+    else:
+        # Biggest parts go first so a large one doesn't end up running on its own after everything else is done
+        def part_size(part: tuple[int, tuple[int, int] | None]) -> int:
+            return os.path.getsize(tasks[part[0]][0]) if part[1] is None else part[1][1] - part[1][0]
+
+        order = sorted(parts, key=part_size, reverse=True)
+        with ProcessPoolExecutor(max_workers=min(jobs, len(parts))) as executor:
+            args = ((tasks[idx][0], span, *tasks[idx][1:]) for idx, span in order)
+            results.update(zip(order, executor.map(_ingest_part, *zip(*args), repeat(collect_stats))))
+
+    # Results are handed back in input order, so merging them gives the same field ordering as a serial run
+    parsed = []
+    for idx, split in enumerate(splits):
+        if len(split) == 1:
+            parsed.append(results[idx, None])
+        else:
+            parsed.append(_merge_ranges(*tasks[idx], split, [results[idx, span] for span in split]))
+    return parsed
+
+
+# Bump this whenever the contents of DataSet/FieldData (or how they're filled in) change
+_CACHE_VERSION = 12
+_CACHE_FILE_NAME = ".jb_api_gen_cache"
+
+
+@dataclass
+class _CachedFile:
+    size: int
+    mtime_ns: int
+    digest: str
+    enum_names: frozenset[str]
+    data: DataSet
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.blake2b()
+    with open(path, "rb") as file:
+        while chunk := file.read(_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Stats aren't kept, runs with --stats don't use the cache
+def _dataset_to_json(data: DataSet) -> dict[str, Any]:
+    return {
+        "send_data": [
+            [opcode, name, _subfields_to_json(sent.fields)] for (opcode, name), sent in data.send_data.items()
+        ],
+        "room_data": _subfields_to_json(data.room_data),
+        "player_data": _subfields_to_json(data.player_data),
+        "enum_data": {name: sorted(vals) for name, vals in data.enum_data.items()},
+        "string_data": (
+            None if data.string_data is None else {name: sketch.to_json() for name, sketch in data.string_data.items()}
+        ),
+        "field_index": {
+            name: {path: [info.types, info.files] for path, info in paths.items()}
+            for name, paths in data.field_index.items()
+        },
+        "using_bc": data.using_bc,
+        "shape_lookups": data.shape_lookups,
+        "shape_hits": data.shape_hits,
+        "room_samples": data.room_samples,
+        "player_samples": data.player_samples,
+    }
+
+
+def _dataset_from_json(obj: dict[str, Any]) -> DataSet:
+    string_data = obj["string_data"]
+    return DataSet(
+        send_data={
+            (str(opcode), str(name)): SentMessages(_subfields_from_json(fields))
+            for opcode, name, fields in obj["send_data"]
+        },
+        room_data=_subfields_from_json(obj["room_data"]),
+        player_data=_subfields_from_json(obj["player_data"]),
+        enum_data={name: {str(val) for val in vals} for name, vals in obj["enum_data"].items()},
+        string_data=(
+            None
+            if string_data is None
+            else {name: ValueSketch.from_json(sketch) for name, sketch in string_data.items()}
+        ),
+        field_index={
+            name: {path: PathInfo(int(types), int(files)) for path, (types, files) in paths.items()}
+            for name, paths in obj["field_index"].items()
+        },
+        using_bc=None if obj["using_bc"] is None else bool(obj["using_bc"]),
+        shape_lookups=int(obj["shape_lookups"]),
+        shape_hits=int(obj["shape_hits"]),
+        room_samples=list(obj["room_samples"]),
+        player_samples=list(obj["player_samples"]),
+    )
+
+
+# JSON rather than pickle, since cache files can end up being passed around along with the logs and loading a pickle
+# runs whatever code it asks for
+def _load_cache(cache_path: str) -> dict[str, _CachedFile]:
+    try:
+        with open(cache_path, "rb") as file:
+            cache = json.loads(file.read())
+        if type(cache) is dict and cache.get("version") == _CACHE_VERSION:
+            return {
+                str(name): _CachedFile(
+                    int(entry["size"]),
+                    int(entry["mtime_ns"]),
+                    str(entry["digest"]),
+                    frozenset(map(str, entry["enum_names"])),
+                    _dataset_from_json(entry["data"]),
+                )
+                for name, entry in cache["files"].items()
+            }
+    except FileNotFoundError:
+        pass
+    except UnicodeDecodeError:  # Written by a version that still used pickle
+        pass
+    except Exception as e:
+        print(f"WARNING: Ignoring unreadable cache file {cache_path} ({e!r})")
+    return {}
+
+
+def _save_cache(cache_path: str, files: dict[str, _CachedFile]) -> None:
+    cache = {
+        "version": _CACHE_VERSION,
+        "files": {
+            name: {
+                "size": entry.size,
+                "mtime_ns": entry.mtime_ns,
+                "digest": entry.digest,
+                "enum_names": sorted(entry.enum_names),
+                "data": _dataset_to_json(entry.data),
+            }
+            for name, entry in files.items()
+        },
+    }
+
+    # Write to a temporary file first so an interrupted run can't leave a broken cache behind
+    tmp_path = f"{cache_path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(cache, file, separators=(",", ":"), ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        # Not being able to cache (read-only folder, full disk, ...) only makes the next run slower
+        print(f"WARNING: Couldn't write cache file {cache_path} ({e!r})")
+        try:
+            os.remove(tmp_path)
+        except OSError:
             pass
-        case _:
-            print(f'WARNING: Unhandled object key {msg["result"]["key"]}')
 
-    return False
+
+def _is_cache_hit(
+    entry: _CachedFile, path: str, stat: os.stat_result, enum_names: list[str], auto_enums: bool
+) -> bool:
+    if entry is None or entry.size != stat.st_size or not entry.enum_names.issuperset(enum_names):
+        return False
+    if auto_enums and entry.data.string_data is None:
+        return False
+    if entry.mtime_ns == stat.st_mtime_ns:
+        return True
+
+    # Timestamp changed (e.g. the file was copied around), only reparse if the content is actually different
+    return entry.digest == _file_digest(path)
+
+
+@dataclass
+class GameConfig:
+    name: str
+    input_folder: str
+    enum_names: list[str] = field(default_factory=list)
+    auto_enums: bool = False
+    readers: bool = False
+
+
+# Manifest for --manifest, a JSON list of {"name", "input_folder", "enum_names", "auto_enums", "readers"} objects
+def _load_manifest(path: str, auto_enums: bool, readers: bool) -> list[GameConfig]:
+    with open(path) as file:
+        entries = json.load(file)
+
+    # Relative input folders are relative to the manifest, not wherever the script gets run from
+    base = Path(path).parent
+    return [
+        GameConfig(
+            entry["name"],
+            str(base / entry["input_folder"]),
+            entry.get("enum_names", []),
+            entry.get("auto_enums", auto_enums),
+            entry.get("readers", readers),
+        )
+        for entry in entries
+    ]
+
+
+def _find_inputs(input_folder: str) -> list[str]:
+    names = sorted(os.listdir(input_folder))
+    return [f"{input_folder}/{f}" for f in names if _uncompressed_name(f).endswith(_INPUT_EXTENSIONS)]
+
+
+# Where a game's input stands after checking the cache, before anything has been parsed
+@dataclass
+class _PendingInput:
+    paths: list[str]
+    enum_names: list[str]
+    auto_enums: bool
+    cache_path: str
+    cache: dict[str, _CachedFile]
+    new_cache: dict[str, _CachedFile] = field(default_factory=dict)
+    file_data: dict[str, DataSet] = field(default_factory=dict)
+    todo: list[tuple[str, os.stat_result]] = field(default_factory=list)
+    cache_changed: bool = False
+
+
+def _check_cache(
+    paths: list[str], enum_names: list[str], auto_enums: bool, collect_stats: bool, cache_path: str
+) -> _PendingInput:
+    # Stats are about parsing, so don't skip any of it when they're wanted (the cache still gets updated)
+    cache = _load_cache(cache_path) if cache_path is not None and not collect_stats else {}
+    pending = _PendingInput(paths, enum_names, auto_enums, cache_path, cache)
+
+    # Only files that are new or have changed since the last run need to be parsed
+    for path in paths:
+        name = os.path.basename(path)
+        stat = os.stat(path)
+        entry = cache.get(name)
+        if _is_cache_hit(entry, path, stat, enum_names, auto_enums):
+            if entry.mtime_ns != stat.st_mtime_ns:
+                entry = replace(entry, mtime_ns=stat.st_mtime_ns)
+                pending.cache_changed = True
+            pending.new_cache[name] = entry
+            pending.file_data[path] = entry.data
+        else:
+            pending.todo.append((path, stat))
+
+    if cache_path is not None and len(cache) > 0:
+        print(f"Using cached data for {len(pending.file_data)} of {len(paths)} input files")
+    return pending
+
+
+def _merge_parsed(
+    pending: _PendingInput,
+    parsed_files: list[DataSet],
+    collect_stats: bool,
+    stages: dict[str, float],
+    save_cache: bool = True,
+) -> DataSet:
+    stage_start = time.perf_counter()
+    for (path, stat), parsed in zip(pending.todo, parsed_files):
+        pending.new_cache[os.path.basename(path)] = _CachedFile(
+            stat.st_size, stat.st_mtime_ns, _file_digest(path), frozenset(pending.enum_names), parsed
+        )
+        pending.file_data[path] = parsed
+
+    # Needs to happen before merging, since merging shares (and then modifies) the per-file data
+    cache_changed = pending.cache_changed or len(pending.todo) > 0 or pending.new_cache.keys() != pending.cache.keys()
+    if pending.cache_path is not None and save_cache and cache_changed:
+        _save_cache(pending.cache_path, pending.new_cache)
+    stages["cache save"] = stages.get("cache save", 0) + time.perf_counter() - stage_start
+    stage_start = time.perf_counter()
+
+    data = DataSet(
+        enum_data={name: set() for name in pending.enum_names},
+        string_data={} if pending.auto_enums else None,
+        stats=Stats() if collect_stats else None,
+    )
+    for path in pending.paths:
+        data.merge(pending.file_data[path])
+
+    # Cached files may have values for enums that weren't asked for this time
+    data.enum_data = {name: data.enum_data[name] for name in pending.enum_names}
+    stages["merge"] = stages.get("merge", 0) + time.perf_counter() - stage_start
+    return data
+
+
+# Files that need parsing from every game go through one process pool, so it's the total amount of input that
+# decides how long this takes rather than the number of games
+def _ingest_games(
+    games: list[tuple[list[str], list[str], bool, str]], collect_stats: bool, jobs: int, save_cache: bool = True
+) -> list[DataSet]:
+    stages: dict[str, float] = {}
+    stage_start = time.perf_counter()
+    pending = [
+        _check_cache(paths, enum_names, auto_enums, collect_stats, cache_path)
+        for paths, enum_names, auto_enums, cache_path in games
+    ]
+    stages["cache lookup"] = time.perf_counter() - stage_start
+    stage_start = time.perf_counter()
+
+    tasks = [(path, game.enum_names, game.auto_enums) for game in pending for path, _ in game.todo]
+    parsed_files = iter(_parse_files(tasks, collect_stats, jobs))
+    stages["parse"] = time.perf_counter() - stage_start
+
+    results = [
+        _merge_parsed(game, [next(parsed_files) for _ in game.todo], collect_stats, stages, save_cache)
+        for game in pending
+    ]
+    if collect_stats:
+        # With several games the stages cover all of them, since they're run together
+        for data in results:
+            data.stats.stages = stages
+    return results
+
+
+def _ingest_files(
+    paths: list[str],
+    enum_names: list[str],
+    auto_enums: bool,
+    collect_stats: bool,
+    jobs: int,
+    cache_path: str = None,
+) -> DataSet:
+    return _ingest_games([(paths, enum_names, auto_enums, cache_path)], collect_stats, jobs)[0]
+
+
+def _output_game(data: DataSet, game: GameConfig, src_dir: Path) -> None:
+    # Enum values also get picked up from nested fields this way, not just the top level
+    stage_start = time.perf_counter()
+    if game.auto_enums:
+        detected = _detect_enums(data)
+        new_names = [name for name in detected if name not in data.enum_data]
+        for name, vals in detected.items():
+            data.enum_data.setdefault(name, set()).update(vals)
+        if len(new_names) > 0:
+            print(f"Detected enum fields: {', '.join(new_names)}")
+        if data.stats is not None:
+            data.stats.stages["auto enums"] = time.perf_counter() - stage_start
+
+    # Output C# files and print sent message breakdown
+    stage_start = time.perf_counter()
+    _output_as_cs(data, game.name, src_dir, data.using_bc, game.readers)
+    _print_results(data)
+
+    if data.stats is not None:
+        data.stats.stages["output"] = time.perf_counter() - stage_start
+        data.stats.deepest = max(_deepest_field(data.room_data, "room"), _deepest_field(data.player_data, "player"))
+
+
+_WATCH_INTERVAL = 0.2
+# Models get regenerated once input has been quiet for a bit, or after a while regardless if it never is
+_WATCH_DEBOUNCE = 0.5
+_WATCH_MAX_DELAY = 2.0
+
+
+# A plain text log being followed as it grows
+@dataclass
+class _LogTail:
+    path: str
+    offset: int = 0
+    pending: bytearray = field(default_factory=bytearray)  # Start of a message that hasn't been fully written yet
+
+
+# Only the bytes appended since the last call get scanned
+def _read_appended(tail: _LogTail, skip: MessageFilter = None) -> Iterator[dict]:
+    if os.path.getsize(tail.path) < tail.offset:  # Truncated or replaced, start over from the beginning
+        tail.offset = 0
+        tail.pending.clear()
+
+    grew = False
+    with open(tail.path, "rb") as file:
+        file.seek(tail.offset)
+        while chunk := file.read(_CHUNK_SIZE):
+            grew = True
+            tail.offset += len(chunk)
+            tail.pending += chunk
+            pos = yield from _extract_json(tail.pending, 0, len(tail.pending), False, "opcode", skip=skip)
+            del tail.pending[:pos]
+
+    # Nothing was added since the last check and the last line is done, so a leftover object is most likely broken
+    # rather than still being written. Without this it would hold back every message after it
+    if not grew and tail.pending.endswith(b"\n"):
+        yield from _extract_json(tail.pending, 0, len(tail.pending), True, "opcode", skip=skip)
+        tail.pending.clear()
+
+
+# Returns whether anything new was read. HAR captures and compressed logs can't be followed, so those are read again
+# in full whenever they change, which is fine since merging the same messages twice doesn't change anything
+def _poll_inputs(
+    data: DataSet, game: GameConfig, tails: dict[str, _LogTail], snapshots: dict[str, tuple[int, int]]
+) -> bool:
+    found = False
+    skip = _message_filter(game.enum_names)
+    for path in _find_inputs(game.input_folder):
+        try:
+            if not _is_compressed(path) and not path.endswith(".har"):
+                for msg in _read_appended(tails.setdefault(path, _LogTail(path)), skip):
+                    _handle_message(data, msg)
+                    found = True
+                continue
+
+            stat = os.stat(path)
+            if snapshots.get(path) != (stat.st_size, stat.st_mtime_ns):
+                snapshots[path] = (stat.st_size, stat.st_mtime_ns)
+                data.merge(_ingest_file(path, game.enum_names, game.auto_enums, False))
+                found = True
+        except FileNotFoundError:  # Removed since the folder was listed
+            tails.pop(path, None)
+    return found
+
+
+# Detected enums go into a copy, so a field that stops looking like an enum later on stops being output as one
+def _with_detected_enums(data: DataSet, game: GameConfig) -> DataSet:
+    if not game.auto_enums:
+        return data
+    enum_data = {name: set(vals) for name, vals in data.enum_data.items()}
+    for name, vals in _detect_enums(data).items():
+        enum_data.setdefault(name, set()).update(vals)
+    return replace(data, enum_data=enum_data)
+
+
+# Only the lines that say something about the schema, not the attributes and braces around them
+def _schema_lines(content: str) -> list[str]:
+    lines = (line.strip().rstrip(",") for line in content.splitlines())
+    return [
+        line
+        for line in lines
+        if line not in ("", "{", "}") and not line.startswith(("[JsonProperty", "//", "using ", "#", "namespace "))
+    ]
+
+
+def _print_schema_diff(name: str, old: str, new: str) -> None:
+    old_lines = _schema_lines(old)
+    new_lines = _schema_lines(new)
+    removed = Counter(old_lines) - Counter(new_lines)
+    added = Counter(new_lines) - Counter(old_lines)
+
+    print(f"{name}:")
+    for sign, lines, changes in (("-", old_lines, removed), ("+", new_lines, added)):
+        for line in lines:
+            if changes[line] > 0:
+                changes[line] -= 1
+                print(f"  {sign} {line}")
+
+
+def _watch_game(game: GameConfig, src_dir: Path) -> None:
+    data = DataSet(enum_data={name: set() for name in game.enum_names}, string_data={} if game.auto_enums else None)
+    tails: dict[str, _LogTail] = {}
+    snapshots: dict[str, tuple[int, int]] = {}
+
+    # Start off with a normal run over everything that's already there
+    _poll_inputs(data, game, tails, snapshots)
+    _index_fields(data)
+    shown = _with_detected_enums(data, game)
+    _output_as_cs(shown, game.name, src_dir, data.using_bc, game.readers)
+    _print_results(data)
+    models, had_output = _render_models(shown, game.name, game.readers)
+
+    print(f"\nWatching {game.input_folder} for new messages, press Ctrl+C to stop")
+    first_input = last_input = None
+    try:
+        while True:
+            time.sleep(_WATCH_INTERVAL)
+            now = time.monotonic()
+            if _poll_inputs(data, game, tails, snapshots):
+                first_input = first_input or now
+                last_input = now
+            if first_input is None or (now - last_input < _WATCH_DEBOUNCE and now - first_input < _WATCH_MAX_DELAY):
+                continue
+            first_input = last_input = None
+
+            _index_fields(data)
+            new_models, wrote_out = _render_models(_with_detected_enums(data, game), game.name, game.readers)
+            for name, content in new_models.items():
+                if content != models.get(name, ""):
+                    path = Path(src_dir) / name
+                    print(f'\n[{time.strftime("%H:%M:%S")}] Updated {path.name}')
+                    # The readers and their tests just follow along with the models
+                    if not path.name.endswith(("ModelReader.cs", "ModelReaderTests.cs")):
+                        _print_schema_diff(path.name, models.get(name, ""), content)
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    _write_if_changed(path, content)
+            models = new_models
+
+            # Templates only get made once there's something to put in the models
+            if wrote_out and not had_output:
+                _output_template_files(game.name, src_dir, data.using_bc, game.readers)
+                had_output = True
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+
+
+_CS_BLOCK_PATTERN = re.compile(r"\b(struct|class|record|enum)\s+(\w+)")
+_CS_PROPERTY_PATTERN = re.compile(r"^public\s+(?!(?:static|const)\s)([\w.<>?, \[\]]+?)\s+(\w+)\s*\{\s*get;")
+_CS_JSON_PROPERTY_PATTERN = re.compile(r'\[JsonProperty\((?:PropertyName\s*=\s*)?"([^"]*)"')
+_CS_ENUM_VALUE_PATTERN = re.compile(r'EnumMember\(Value\s*=\s*"([^"]*)"')
+_CS_ATTRIBUTE_PATTERN = re.compile(r"\[[^\]]*\]")
+_CS_LIST_PATTERN = re.compile(r"(?:List|IList|IReadOnlyList|IEnumerable)<(\w+)\??>")
+
+
+# Structs (by name, each a map of JSON key to C# type) and enums (by name, each a set of JSON values)
+@dataclass
+class _CsModels:
+    structs: dict[str, dict[str, str]] = field(default_factory=dict)
+    enums: dict[str, set[str]] = field(default_factory=dict)
+
+
+# Reads back what was generated into the models, hand written properties and enum members included. Only the parts
+# Newtonsoft looks at are kept, the rest (methods, comments, other attributes) is skipped over
+def _parse_cs_models(content: str, models: _CsModels) -> None:
+    blocks: list[tuple[str, str] | None] = []  # One entry per open brace, the struct/enum it started (if any)
+    pending_block = None
+    json_key = enum_value = None
+    ignored = False
+
+    for line in content.splitlines():
+        line = line.split("//", 1)[0].strip()
+        block = blocks[-1] if len(blocks) > 0 else None
+        if block is not None and block[0] == "struct":
+            # Attributes apply to the next member, which is only kept if it's a property
+            json_key = next((m.group(1) for m in _CS_JSON_PROPERTY_PATTERN.finditer(line)), json_key)
+            ignored |= "[JsonIgnore" in line
+            declaration = _CS_ATTRIBUTE_PATTERN.sub("", line).strip()
+            if (prop := _CS_PROPERTY_PATTERN.match(declaration)) is not None and not ignored:
+                models.structs[block[1]][json_key if json_key is not None else prop.group(2)] = prop.group(1)
+            if declaration != "":
+                json_key = None
+                ignored = False
+
+        # Braces can share a line with anything, e.g. a whole enum on one line
+        for part in re.split(r"([{}])", line):
+            if part == "{":
+                blocks.append(pending_block)
+                pending_block = None
+            elif part == "}":
+                if len(blocks) > 0:
+                    blocks.pop()
+            elif len(blocks) > 0 and blocks[-1] is not None and blocks[-1][0] == "enum":
+                for member in part.split(","):
+                    enum_value = next((m.group(1) for m in _CS_ENUM_VALUE_PATTERN.finditer(member)), enum_value)
+                    name = _CS_ATTRIBUTE_PATTERN.sub("", member).split("=", 1)[0].strip()
+                    if name.isidentifier():
+                        models.enums[blocks[-1][1]].add(name if enum_value is None else enum_value)
+                        enum_value = None
+            elif (header := _CS_BLOCK_PATTERN.search(part)) is not None and "(" not in part[: header.start()]:
+                kind = "enum" if header.group(1) == "enum" else "struct"
+                pending_block = (kind, header.group(2))
+                if kind == "enum":
+                    models.enums.setdefault(pending_block[1], set())
+                else:
+                    models.structs.setdefault(pending_block[1], {})
+
+
+# A property of the models as far as Newtonsoft is concerned
+@dataclass
+class _SchemaField:
+    path: str
+    type_name: str  # Nested structs are just "object", since the names picked for them don't matter
+    enum: str = None  # Name of the enum, if it's one
+
+    # Enums are told apart by their values instead, as they're often named by hand
+    @property
+    def shape(self) -> str:
+        if self.enum is None:
+            return self.type_name
+        return "enum?" if self.type_name.endswith("?") else "enum"
+
+
+# Every field path (e.g. room.players[].name) in the models, keyed case insensitively like Newtonsoft matches them
+def _schema_paths(
+    models: _CsModels, struct: str, path: str, paths: dict[str, _SchemaField], parents: tuple[str, ...] = ()
+) -> None:
+    if struct in parents:  # Hand written models can refer back to themselves
+        return
+    for key, type_name in models.structs.get(struct, {}).items():
+        field_path = f"{path}.{key}"
+        base_type = type_name.rstrip("?")
+        nullable = "?" if type_name.endswith("?") else ""
+        if (item := _CS_LIST_PATTERN.fullmatch(base_type)) is not None and item.group(1) in models.structs:
+            paths[field_path.casefold()] = _SchemaField(field_path, f"List<object>{nullable}")
+            _schema_paths(models, item.group(1), f"{field_path}[]", paths, (*parents, struct))
+        elif base_type in models.structs:
+            paths[field_path.casefold()] = _SchemaField(field_path, f"object{nullable}")
+            _schema_paths(models, base_type, field_path, paths, (*parents, struct))
+        else:
+            enum = base_type if base_type in models.enums else None
+            paths[field_path.casefold()] = _SchemaField(field_path, type_name, enum)
+
+
+def _model_schema(contents: Iterable[str], game_name: str) -> tuple[dict[str, _SchemaField], dict[str, set[str]]]:
+    models = _CsModels()
+    for content in contents:
+        _parse_cs_models(content, models)
+    paths: dict[str, _SchemaField] = {}
+    _schema_paths(models, f"{game_name}Room", "room", paths)
+    _schema_paths(models, f"{game_name}Player", "player", paths)
+    return paths, models.enums
+
+
+# Values in new that old doesn't have, leaving out the None member that the generator adds to every enum
+def _new_enum_values(new: set[str], old: set[str]) -> list[str]:
+    known = {val.casefold() for val in old}
+    return sorted(val for val in new if val != "None" and val.casefold() not in known)
+
+
+# Compares the Player/Room models in the repo with what would be generated now and prints what changed, without
+# writing anything. Returns whether they differ
+def _check_game(data: DataSet, game: GameConfig, src_dir: Path) -> bool:
+    rendered, _ = _render_models(_with_detected_enums(data, game), game.name)
+    names = [name for name in rendered if name.endswith(("Player.cs", "Room.cs"))]
+    # Hand written models often have their nested structs in files of their own
+    model_dir = src_dir / "Games" / game.name / "Models"
+    current = [path.read_text(encoding="utf-8-sig") for path in sorted(model_dir.glob("*.cs"))]
+    old_paths, old_enums = _model_schema(current, game.name)
+    new_paths, new_enums = _model_schema((rendered[name] for name in names), game.name)
+
+    changes = []
+    compared_enums = set()  # The same enum usually shows up at a few paths, its values only need listing once
+    for key, new in new_paths.items():
+        old = old_paths.get(key)
+        if old is None:
+            values = _new_enum_values(new_enums[new.enum], set()) if new.enum is not None else []
+            changes.append(f"  + {new.path}: {new.type_name}" + (f" ({', '.join(values)})" if values else ""))
+        elif old.shape != new.shape:
+            changes.append(f"  ~ {new.path}: {old.type_name} -> {new.type_name}")
+        elif new.enum is not None and (old.enum, new.enum) not in compared_enums:
+            compared_enums.add((old.enum, new.enum))
+            if added := _new_enum_values(new_enums[new.enum], old_enums[old.enum]):
+                changes.append(f"  + {new.path} values: {', '.join(added)}")
+    changes += [f"  - {old.path}: {old.type_name}" for key, old in old_paths.items() if key not in new_paths]
+
+    if len(current) == 0:
+        print(f"{game.name}: no models in {model_dir} yet")
+    elif len(changes) == 0:
+        print(f"{game.name}: models match the logs")
+    else:
+        print(f"{game.name}: {len(changes)} difference{'s' if len(changes) > 1 else ''} from the logs")
+    for line in changes:
+        print(line)
+    return len(changes) > 0 or len(current) == 0
+
+
+def _describe_types(types: int) -> str:
+    names = [_TYPE_NAMES[flag] for flag in _iter_type_flags(types)]
+    if types & _TYPE_NULL:
+        names.append("null")
+    return " | ".join(names) or "unknown"
+
+
+# `jb_api_gen.py query <input_folder> ...`, answered from the cache so only new or changed logs get read
+def _run_query(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="jb_api_gen.py query", description="Look up where fields show up in the logs in a folder"
+    )
+    parser.add_argument("input_folder", help="Same folder that would be given to the generator")
+    parser.add_argument("fields", nargs="*", metavar="field", help="Field names to look for, wildcards (*) work too")
+    parser.add_argument("--nullable", action="store_true", help="Only show paths that are sometimes null")
+    args = parser.parse_args(argv)
+
+    paths = _find_inputs(args.input_folder)
+    if zstandard is None and any(path.endswith(".zst") for path in paths):
+        print("ERROR: reading .zst logs needs the zstandard package (pip install zstandard)")
+        exit(1)
+    data = _ingest_files(paths, [], False, False, 1, f"{args.input_folder}/{_CACHE_FILE_NAME}")
+
+    names = [name for name in data.field_index if not args.fields or any(fnmatch(name, f) for f in args.fields)]
+    results = sorted(
+        (path, info)
+        for name in names
+        for path, info in data.field_index[name].items()
+        if not args.nullable or info.types & _TYPE_NULL
+    )
+    if len(results) == 0:
+        print("No matching fields")
+    width = max((len(path) for path, _ in results), default=0)
+    for path, info in results:
+        print(f"{path.ljust(width)}  {_describe_types(info.types)} (in {info.files} of {len(paths)} files)")
+
+
+# Replay files hold every message from a game's logs, one JSON line each after a header line:
+# [<seconds since the start, or null>, "s" (sent by the browser) or "r" (received), <message>]
+# Each distinct message is only written out once, later copies have the number of the one they repeat instead. The
+# counters every message gets (_REPLAY_COUNTERS) are left out so that repeats are actually the same, the replay
+# server numbers the messages for each client again
+_REPLAY_VERSION = 1
+_REPLAY_COUNTERS = ("pc", "seq", "re")
+# Received messages with these keys are about the player that recorded the log, see _replay_template
+_SELF_KEY_PREFIXES = ("bc:customer:", "player:")
+_SELF_PLACEHOLDER = "\0self\0"
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+# How long to wait for clients to answer a ping, or to close the connection once asked to
+_WS_TIMEOUT = 30.0
+
+
+def _open_zstd_writer(path: str, mode: str) -> BinaryIO:
+    return zstandard.ZstdCompressor().stream_writer(open(path, mode), closefd=True)
+
+
+_COMPRESSORS: dict[str, Callable[[str, str], BinaryIO]] = {**_DECOMPRESSORS, ".zst": _open_zstd_writer}
+
+
+def _without_counters(msg: dict) -> dict:
+    return {key: val for key, val in msg.items() if key not in _REPLAY_COUNTERS}
+
+
+# Messages in a log along with whether the browser sent them, and when (only HAR captures have times)
+def _iter_timed_messages(path: str) -> Iterator[tuple[float | None, bool, dict]]:
+    if not _uncompressed_name(path).endswith(".har"):
+        for msg in _iter_file_json(path, "opcode"):
+            yield None, msg["opcode"] in _SENT_OPCODES, msg
+        return
+
+    for frame in _scan_file(path, _extract_har_frames):
+        if (msg := _decode_har_frame(frame)) is not None:
+            timestamp = frame.get("time")
+            yield timestamp if type(timestamp) in (int, float) else None, _HAR_FRAME_TYPES[frame["type"]], msg
+
+
+def _export_replay(paths: list[str], game_name: str, out_path: str) -> None:
+    seen: dict[bytes, int] = {}
+    count = sent_count = 0
+    offset = 0.0
+    with _COMPRESSORS.get(os.path.splitext(out_path)[1], open)(out_path, "wb") as file:
+        file.write(json.dumps({"replay": _REPLAY_VERSION, "game": game_name}).encode() + b"\n")
+        for path in paths:
+            # Each log carries on from where the one before it ended
+            first = last = None
+            for timestamp, sent, msg in _iter_timed_messages(path):
+                t = None
+                if timestamp is not None:
+                    first = timestamp if first is None else first
+                    last = timestamp
+                    t = round(offset + timestamp - first, 3)
+
+                direction = b'"s"' if sent else b'"r"'
+                body = json.dumps(_without_counters(msg), separators=(",", ":"), ensure_ascii=False).encode()
+                digest = hashlib.blake2b(direction + body, digest_size=16).digest()
+                if (ref := seen.get(digest)) is not None:
+                    body = str(ref).encode()
+                else:
+                    seen[digest] = len(seen)
+                file.write(b"[%s,%s,%s]\n" % (json.dumps(t).encode(), direction, body))
+                count += 1
+                sent_count += sent
+            if first is not None:
+                offset += last - first
+
+    print(f"Exported {count} messages ({sent_count} sent, {len(seen)} distinct) from {len(paths)} logs to {out_path}")
+
+
+def _iter_lines(path: str) -> Iterator[bytes]:
+    rest = b""
+    for chunk in _read_chunks(path):
+        lines = (rest + chunk).split(b"\n")
+        rest = lines.pop()
+        yield from lines
+    if len(rest) > 0:
+        yield rest
+
+
+# What gets compared between the recorded messages and the ones clients send back
+def _sent_group(msg: dict) -> tuple[str, str]:
+    params = msg.get("params")
+    body = params.get("body") if type(params) is dict and msg["opcode"] == "client/send" else params
+    return msg["opcode"], _send_group_name(body) if type(body) is dict else ""
+
+
+# Message JSON split where the client's own ID goes: (before, which ID, after). That way every client gets the welcome
+# and player updates meant for it, instead of ones for whoever recorded the log. The opening brace is left off, since
+# that's where the client's own "pc" goes
+def _replay_template(msg: dict) -> tuple[bytes, str | None, bytes]:
+    msg = _without_counters(msg)  # Older replay files still have them
+    result = msg.get("result")
+    fill = None
+    if type(result) is dict:
+        if msg["opcode"] == "client/welcome" and "id" in result:
+            fill, result = "id", {**result, "id": _SELF_PLACEHOLDER}
+        elif type(key := result.get("key")) is str and key.startswith(_SELF_KEY_PREFIXES):
+            fill = next(prefix for prefix in _SELF_KEY_PREFIXES if key.startswith(prefix))
+            result = {**result, "key": fill + _SELF_PLACEHOLDER}
+
+    body = json.dumps({**msg, "result": result} if fill else msg, separators=(",", ":"), ensure_ascii=False).encode()
+    body = body[1:]
+    if fill is None:
+        return body, None, b""
+    placeholder = json.dumps(_SELF_PLACEHOLDER).encode()
+    before, _, after = body.partition(placeholder if fill == "id" else placeholder[1:-1])
+    return before, fill, after
+
+
+@dataclass
+class _Replay:
+    game: str
+    bodies: list[tuple[bytes, str | None, bytes]]
+    received: list[tuple[float | None, int]]  # Time and body of each message sent to the clients
+    expected: Counter[tuple[str, str]]  # Messages the recording sent back, by group
+
+
+def _load_replay(path: str) -> _Replay:
+    lines = _iter_lines(path)
+    header = json.loads(next(lines, b"null"))
+    if type(header) is not dict or header.get("replay") != _REPLAY_VERSION:
+        raise ValueError(f"not a version {_REPLAY_VERSION} replay file")
+
+    replay = _Replay(header.get("game", ""), [], [], Counter())
+    groups: dict[int, tuple[str, str]] = {}
+    count = 0
+    for line in lines:
+        if len(line.strip()) == 0:
+            continue
+        t, direction, body = json.loads(line)
+        if type(body) is not int:
+            if direction == "s":
+                groups[count] = _sent_group(body)
+                replay.bodies.append((b"", None, b""))
+            else:
+                replay.bodies.append(_replay_template(body))
+            body = count
+            count += 1
+        if direction == "s":
+            replay.expected[groups[body]] += 1
+        else:
+            replay.received.append((t, body))
+    return replay
+
+
+def _ws_frame(payload: bytes, opcode: int = 1) -> bytes:
+    size = len(payload)
+    if size < 126:
+        return bytes((0x80 | opcode, size)) + payload
+    if size < 1 << 16:
+        return struct.pack("!BBH", 0x80 | opcode, 126, size) + payload
+    return struct.pack("!BBQ", 0x80 | opcode, 127, size) + payload
+
+
+def _ws_unmask(payload: bytes, mask: bytes) -> bytes:
+    size = len(payload)
+    key = int.from_bytes((mask * (size // 4 + 1))[:size], "little")
+    return (int.from_bytes(payload, "little") ^ key).to_bytes(size, "little")
+
+
+# Opcode and payload of the next message, with fragments joined back together
+async def _ws_read_message(reader: asyncio.StreamReader) -> tuple[int, bytes]:
+    message = bytearray()
+    message_opcode = 0
+    while True:
+        head = await reader.readexactly(2)
+        size = head[1] & 0x7F
+        if size == 126:
+            size = struct.unpack("!H", await reader.readexactly(2))[0]
+        elif size == 127:
+            size = struct.unpack("!Q", await reader.readexactly(8))[0]
+        mask = await reader.readexactly(4) if head[1] & 0x80 else None
+        payload = await reader.readexactly(size)
+        if mask is not None:
+            payload = _ws_unmask(payload, mask)
+
+        opcode = head[0] & 0x0F
+        if opcode >= 0x8:  # Control frames can show up in between fragments
+            return opcode, payload
+        message += payload
+        message_opcode = message_opcode or opcode
+        if head[0] & 0x80:
+            return message_opcode, bytes(message)
+
+
+@dataclass
+class _ReplayClient:
+    name: str
+    own: dict[str, bytes]  # Filled in to _replay_template's gaps
+    writer: asyncio.StreamWriter
+    replies: Counter[tuple[str, str]] = field(default_factory=Counter)
+    latencies: list[float] = field(default_factory=list)  # From the last message sent to each reply
+    last_sent: float = 0.0
+    sent: int = 0
+    elapsed: float = None  # Set once the client has read everything
+    pong: asyncio.Event = field(default_factory=asyncio.Event)
+    closed: bool = False
+
+
+@dataclass
+class _ReplayRun:
+    replay: _Replay
+    wanted: int
+    fast: bool
+    speed: float
+    linger: float
+    app_tag: str
+    clients: list[_ReplayClient] = field(default_factory=list)
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+    finished: int = 0
+
+
+async def _read_replies(client: _ReplayClient, reader: asyncio.StreamReader) -> None:
+    try:
+        while True:
+            opcode, payload = await _ws_read_message(reader)
+            if opcode == 0x8:
+                break
+            if opcode == 0x9:
+                client.writer.write(_ws_frame(payload, 0xA))
+            elif opcode == 0xA:
+                client.pong.set()
+            if opcode != 0x1:
+                continue
+
+            client.latencies.append(time.perf_counter() - client.last_sent)
+            try:
+                msg = json.loads(payload)
+            except ValueError:
+                msg = None
+            if type(msg) is dict and msg.get("opcode") in _SENT_OPCODES:
+                client.replies[_sent_group(msg)] += 1
+            else:
+                client.replies[(str(msg.get("opcode") if type(msg) is dict else "invalid"), "")] += 1
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    client.closed = True
+
+
+async def _replay_to(run: _ReplayRun, client: _ReplayClient) -> None:
+    start = time.perf_counter()
+    for t, index in run.replay.received:
+        if client.closed:
+            return
+        if not run.fast and t is not None and (delay := start + t / run.speed - time.perf_counter()) > 0:
+            await asyncio.sleep(delay)
+
+        before, fill, after = run.replay.bodies[index]
+        body = b'{"pc":%d,%s' % (client.sent, before)
+        client.writer.write(_ws_frame(body if fill is None else body + client.own[fill] + after))
+        await client.writer.drain()
+        client.last_sent = time.perf_counter()
+        client.sent += 1
+
+    # Everything written so far could still be sitting in a buffer somewhere. The pong only comes back once the client
+    # has read up to the ping, so that's when it's actually done
+    client.writer.write(_ws_frame(b"", 0x9))
+    await client.writer.drain()
+    try:
+        await asyncio.wait_for(client.pong.wait(), _WS_TIMEOUT)
+    except asyncio.TimeoutError:
+        print(f"WARNING: {client.name} didn't answer a ping, its time only counts up to the last message being sent")
+        client.elapsed = client.last_sent - start
+        return
+    client.elapsed = time.perf_counter() - start
+
+
+def _http_response(writer: asyncio.StreamWriter, status: str, body: bytes = b"") -> None:
+    head = f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+    writer.write(head.encode() + b"Connection: close\r\n\r\n" + body)
+
+
+async def _serve_replay_connection(
+    run: _ReplayRun, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    try:
+        request, *header_lines = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        writer.close()
+        return
+    method, target = (request.split(" ") + [""])[:2]
+    headers = {name.strip().lower(): val.strip() for name, _, val in (line.partition(":") for line in header_lines)}
+    url = urllib.parse.urlsplit(target)
+
+    # Clients look the room up before connecting to it
+    if headers.get("upgrade", "").lower() != "websocket":
+        if method == "GET" and url.path.startswith("/api/v2/rooms/"):
+            code = url.path.rpartition("/")[2].upper()
+            room = {"appTag": run.app_tag, "code": code, "host": headers.get("host"), "locked": False}
+            _http_response(writer, "200 OK", json.dumps({"ok": True, "body": room}).encode())
+        else:
+            _http_response(writer, "404 Not Found", b'{"ok":false,"error":"not found"}')
+        writer.close()
+        return
+    if len(run.clients) >= run.wanted or "sec-websocket-key" not in headers:
+        _http_response(writer, "503 Service Unavailable" if "sec-websocket-key" in headers else "400 Bad Request")
+        writer.close()
+        return
+
+    accept = base64.b64encode(hashlib.sha1((headers["sec-websocket-key"] + _WS_GUID).encode()).digest()).decode()
+    response = "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+    response += f"Sec-WebSocket-Accept: {accept}\r\n"
+    if protocols := headers.get("sec-websocket-protocol"):
+        response += f"Sec-WebSocket-Protocol: {protocols.split(',')[0].strip()}\r\n"
+    writer.write(response.encode() + b"\r\n")
+
+    # ID 1 is the host, the same as in an actual room
+    player_id = str(len(run.clients) + 2).encode()
+    query = urllib.parse.parse_qs(url.query)
+    user_id = json.dumps(query.get("user-id", [player_id.decode()])[0])[1:-1].encode()
+    own = {"id": player_id, "player:": player_id, "bc:customer:": user_id}
+    client = _ReplayClient(query.get("name", ["?"])[0], own, writer)
+    run.clients.append(client)
+    print(f"{client.name} connected ({len(run.clients)}/{run.wanted})")
+    if len(run.clients) == run.wanted:
+        run.ready.set()
+
+    listener = asyncio.create_task(_read_replies(client, reader))
+    try:
+        await run.ready.wait()
+        await _replay_to(run, client)
+        if not client.closed:
+            await asyncio.sleep(run.linger)  # Replies to the last few messages can take a bit
+            writer.write(_ws_frame(struct.pack("!H", 1000), 0x8))
+            await writer.drain()
+            await asyncio.wait_for(listener, _WS_TIMEOUT)  # Lets the client close its end first
+    except (ConnectionError, asyncio.TimeoutError):
+        client.closed = True
+    finally:
+        listener.cancel()
+        writer.close()
+        run.finished += 1
+        if run.finished == run.wanted:
+            run.done.set()
+
+
+def _percentile(ordered: list[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if len(ordered) > 0 else 0.0
+
+
+# Returns whether every kind of message the recording sent came back from every client
+def _print_replay_report(run: _ReplayRun) -> bool:
+    clients = run.clients
+    longest = max((client.elapsed or 0.0 for client in clients), default=0.0)
+    total = sum(client.sent for client in clients)
+    print(f"\nReplayed {len(run.replay.received)} messages to {len(clients)} clients in {longest:.2f} s", end="")
+    print(f" ({total / longest:,.0f} messages/s in total)" if longest > 0 else "")
+    if len(dropped := [client.name for client in clients if client.elapsed is None]) > 0:
+        print(f"Disconnected before the end: {', '.join(dropped)}")
+
+    # Without any gaps between messages there's nothing to measure replies from
+    latencies = sorted(chain.from_iterable(client.latencies for client in clients))
+    if len(latencies) > 0 and not run.fast:
+        p50, p95 = _percentile(latencies, 0.5) * 1000, _percentile(latencies, 0.95) * 1000
+        print(f"Reply latency: {p50:.1f} ms median, {p95:.1f} ms p95, {latencies[-1] * 1000:.1f} ms max")
+
+    print("\nSent back (recorded -> fewest/most from a client):")
+    missing = []
+    for group in sorted(run.replay.expected.keys() | set().union(*(client.replies for client in clients))):
+        counts = [client.replies[group] for client in clients]
+        expected = run.replay.expected[group]
+        note = "" if expected > 0 else " (not in the recording)"
+        if expected > 0 and min(counts, default=0) == 0:
+            note = " MISSING"
+            missing.append(group)
+        print(f'    {group[0]} "{group[1]}": {expected} -> {min(counts, default=0)}/{max(counts, default=0)}{note}')
+    return len(missing) == 0 and len(dropped) == 0
+
+
+async def _serve_replay(replay: _Replay, args: argparse.Namespace) -> bool:
+    run = _ReplayRun(replay, args.clients, args.fast, args.speed, args.linger, args.app_tag or replay.game.lower())
+    server = await asyncio.start_server(partial(_serve_replay_connection, run), args.host, args.port)
+    async with server:
+        print(f"Replaying {len(replay.received)} messages of {replay.game or 'a game'} to {args.clients} client(s)")
+        print(f"Waiting for connections, use --ecast_host http://{args.host}:{args.port} (any room code works)")
+        await run.ready.wait()
+        print("Everyone's connected, starting the replay")
+        await run.done.wait()
+    return _print_replay_report(run)
+
+
+# `jb_api_gen.py replay <replay_file>`, stands in for the Jackbox server to try game clients out without a real room
+def _run_replay(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="jb_api_gen.py replay",
+        description="Play back a file from --export-replay to WebSocket clients, and check what they send back",
+    )
+    parser.add_argument("replay_file", help="File written by --export-replay")
+    parser.add_argument("-n", "--clients", type=int, default=1, help="Clients to wait for before starting (1)")
+    parser.add_argument("--fast", action="store_true", help="Send as fast as the clients keep up, ignoring the times")
+    parser.add_argument("--speed", type=float, default=1.0, help="Playback speed when not using --fast (1.0)")
+    parser.add_argument("--linger", type=float, default=2.0, help="Seconds to wait for replies at the end (2.0)")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on (8080)")
+    parser.add_argument("--app-tag", help="App tag clients get when looking up the room (the game name in lowercase)")
+    args = parser.parse_args(argv)
+    if args.clients < 1 or args.speed <= 0:
+        parser.error("--clients and --speed have to be positive")
+
+    if zstandard is None and args.replay_file.endswith(".zst"):
+        print("ERROR: reading .zst files needs the zstandard package (pip install zstandard)")
+        exit(1)
+    try:
+        replay = _load_replay(args.replay_file)
+    except (OSError, ValueError, TypeError) as e:
+        print(f"ERROR: couldn't read replay {args.replay_file} ({e!r})")
+        exit(1)
+
+    try:
+        ok = asyncio.run(_serve_replay(replay, args))
+    except KeyboardInterrupt:
+        print("\nStopped")
+        exit(1)
+    exit(0 if ok else 1)
 
 
 if __name__ == "__main__":
-    # Make sure script is called correctly
-    if len(sys.argv) < 3:
-        print("Usage: jb_api_gen.py <game_name> <input_folder> [enum_name...]")
+    if sys.argv[1:2] == ["query"]:
+        _run_query(sys.argv[2:])
+        exit(0)
+    if sys.argv[1:2] == ["replay"]:
+        _run_replay(sys.argv[2:])
+
+    parser = argparse.ArgumentParser(
+        description="Generate JackboxGPT models and templates from Jackbox JSON logs",
+        epilog='Use "jb_api_gen.py query <input_folder> [field...]" to look up where fields show up in the logs, and '
+        '"jb_api_gen.py replay <replay_file>" to play back a file from --export-replay to game clients',
+    )
+    parser.add_argument("game_name", nargs="?", help="Name of the game, e.g. JokeBoat")
+    parser.add_argument(
+        "input_folder",
+        nargs="?",
+        help="Folder containing the .txt/.json logs (or .har captures) for this game, optionally compressed",
+    )
+    parser.add_argument("enum_names", nargs="*", metavar="enum_name", help="Field names that should become enums")
+    parser.add_argument(
+        "--manifest",
+        metavar="JSON_FILE",
+        help="Regenerate every game listed in JSON_FILE instead of a single one (see Extending.md)",
+    )
+    parser.add_argument(
+        "--auto-enums", action="store_true", help="Also turn string fields with only a few distinct values into enums"
+    )
+    parser.add_argument(
+        "--readers",
+        action="store_true",
+        help="Also generate a reader that fills in the models in a single pass, along with tests for it",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Number of processes used to read input files (1 by default, or one per core with --manifest)",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help=f"Don't read or write {_CACHE_FILE_NAME} in the input folder"
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep following the input folder as logs grow, and update the models whenever something new shows up",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Only list how the Player/Room models in the repo differ from the logs, exiting with 1 if they do",
+    )
+    parser.add_argument(
+        "--export-replay",
+        metavar="REPLAY_FILE",
+        help='Write the messages in the logs to REPLAY_FILE for "jb_api_gen.py replay" instead of generating models',
+    )
+    parser.add_argument(
+        "--stats",
+        nargs="?",
+        const="",
+        metavar="JSON_FILE",
+        help="Print where the time went, and save the numbers to JSON_FILE (jb_api_gen_stats.json next to this script "
+        "by default)",
+    )
+    args = parser.parse_args()
+    collect_stats = args.stats is not None
+
+    if args.watch and (args.manifest is not None or collect_stats):
+        parser.error("--watch can't be combined with --manifest or --stats")
+    if args.check and (args.watch or collect_stats):
+        parser.error("--check can't be combined with --watch or --stats")
+    if args.export_replay is not None and (args.manifest is not None or collect_stats or args.watch or args.check):
+        parser.error("--export-replay can't be combined with --manifest, --stats, --watch or --check")
+    if args.manifest is not None:
+        if args.game_name is not None:
+            parser.error("game_name and input_folder can't be combined with --manifest")
+        try:
+            games = _load_manifest(args.manifest, args.auto_enums, args.readers)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"ERROR: couldn't read manifest {args.manifest} ({e!r})")
+            exit(1)
+        jobs = args.jobs or os.cpu_count() or 1
+    else:
+        if args.input_folder is None:
+            parser.error("the following arguments are required: game_name, input_folder (or --manifest)")
+        games = [GameConfig(args.game_name, args.input_folder, args.enum_names, args.auto_enums, args.readers)]
+        jobs = args.jobs or 1
+
+    # Find all the input data
+    input_paths = [_find_inputs(game.input_folder) for game in games]
+    written_paths = [args.export_replay] if args.export_replay is not None else []
+    if zstandard is None and any(path.endswith(".zst") for path in chain(*input_paths, written_paths)):
+        print("ERROR: reading or writing .zst files needs the zstandard package (pip install zstandard)")
         exit(1)
 
+    # Replays only need the logs, not the repo
+    if args.export_replay is not None:
+        _export_replay(input_paths[0], games[0].name, args.export_replay)
+        exit(0)
+
     # Make sure script is run in the expected location
     src_dir = Path(__file__).resolve().parent / "src"
     if not (src_dir / "Engines").is_dir():
         print("ERROR: this script is intended to be run inside the JackboxGPT repo folder")
         exit(1)
 
-    # Fetch all the input data
-    lines: list[str] = []
-    for path in [f for f in os.listdir(sys.argv[2]) if f.endswith(".txt") or f.endswith(".json")]:
-        with open(f"{sys.argv[2]}/{path}", encoding="utf-8") as file:
-            lines.extend(file.readlines())
-
-    # Prepare the data set, including setting up sets for each enum given
-    data = DataSet()
-    if len(sys.argv) > 4:
-        for enum in sys.argv[3:]:
-            data.enum_data[enum] = set()
-
-    # Fetch JSON messages from input data
-    json_msgs: list[dict] = _transform_to_json(lines, "opcode")
-
-    # Handle messages based on opcode
-    using_bc: bool = None
-    action_keys = ["action", "key"]
-    for msg in json_msgs:
-        match msg["opcode"]:
-            case "object":
-                # Determine what kind of messages are being exchanged
-                if _sort_object_by_key(data, msg["result"]["key"]) and using_bc is None:
-                    using_bc = msg["result"]["key"].startswith("bc:")
-
-                # Keep track of enum values
-                for key in data.enum_data.keys():
-                    if key in msg["result"]["val"] and type(msg["result"]["val"][key]) == str:
-                        data.enum_data[key].add(msg["result"]["val"][key])
-            case "client/send":
-                _track_send_data(msg["params"]["body"], data.send_data, action_keys)
-            case "text/update":
-                _track_send_data(msg["params"], data.send_data, action_keys)
-            case "object/update":
-                _track_send_data(msg["params"], data.send_data, action_keys)
-            case "client/welcome":
-                pass
-            case "room/lock":
-                pass
-            case "room/exit":
-                pass
-            case "ok":
-                pass
-            case "text":
-                pass
-            case "drop":
-                pass
-            case _:
-                print(f'WARNING: Unhandled opcode key {msg["opcode"]}')
-
-    # Output C# files and print sent message breakdown
-    _output_as_cs(data, sys.argv[1], src_dir, using_bc)
-    _print_results(data)
+    if args.watch:
+        _watch_game(games[0], src_dir)
+        exit(0)
+
+    # Read in the data sets, including setting up sets for each enum given
+    cache_paths = [None if args.no_cache else f"{game.input_folder}/{_CACHE_FILE_NAME}" for game in games]
+    datasets = _ingest_games(
+        [
+            (paths, game.enum_names, game.auto_enums, cache_path)
+            for game, paths, cache_path in zip(games, input_paths, cache_paths)
+        ],
+        collect_stats,
+        jobs,
+        save_cache=not args.check,  # Checking only reads the cache, so it can run over a folder without changing it
+    )
+
+    if args.check:
+        drifted = [_check_game(data, game, src_dir) for game, data in zip(games, datasets)]
+        exit(1 if any(drifted) else 0)
+
+    reports = {}
+    for game, data in zip(games, datasets):
+        if args.manifest is not None:
+            print(f"\n{game.name}:")
+        _output_game(data, game, src_dir)
+        if collect_stats:
+            peak_memory = _peak_memory()
+            _print_stats(data.stats, peak_memory)
+            reports[game.name] = _stats_report(data.stats, peak_memory)
+
+    if collect_stats:
+        # Kept out of the working directory by default, it's often the log folder and would get read in as a log
+        stats_path = args.stats or src_dir.parent / "jb_api_gen_stats.json"
+        with open(stats_path, "w") as file:
+            # A single game keeps the report at the top level, same as before --manifest existed
+            json.dump(reports if args.manifest is not None else reports[games[0].name], file, indent=2)
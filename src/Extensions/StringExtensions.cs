@@ -18,5 +18,14 @@ namespace JackboxGPT.Extensions
         {
             return Regex.Replace(input, "\\[.*?\\]", string.Empty);
         }
+
+        // Ecast hosts use TLS unless they're given as "http://<host>" (like a local replay server)
+        public static string AsEcastUrl(this string host, bool webSocket)
+        {
+            const string plainPrefix = "http://";
+            if (host.StartsWith(plainPrefix))
+                return $"{(webSocket ? "ws" : "http")}://{host[plainPrefix.Length..]}";
+            return $"{(webSocket ? "wss" : "https")}://{host}";
+        }
     }
 }
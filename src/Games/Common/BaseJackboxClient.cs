@@ -1,13 +1,16 @@
 ﻿#nullable enable
 using System;
+using System.Buffers;
 using System.Net.WebSockets;
 using System.Text;
+using System.Text.Json;
 using System.Threading;
 using JackboxGPT.Extensions;
 using JackboxGPT.Games.Common.Models;
 using JackboxGPT.Services;
 using Newtonsoft.Json;
 using Newtonsoft.Json.Linq;
+using JsonException = System.Text.Json.JsonException;
 using Serilog;
 using Websocket.Client;
 
@@ -26,6 +29,10 @@ namespace JackboxGPT.Games.Common
         protected abstract string KEY_ROOM { get; }
         protected abstract string KEY_PLAYER_PREFIX { get; }
 
+        // Generated by jb_api_gen.py --readers, room/player updates are read in a single pass when there is one.
+        // Those updates then skip HandleOperation and go straight to UpdateRoom/UpdateSelf, so react to them there
+        protected virtual IModelReader<TRoom, TPlayer>? ModelReader => null;
+
         public event EventHandler<ClientWelcome>? PlayerStateChanged;
         public event EventHandler<Revision<TRoom>>? OnRoomUpdate;
         public event EventHandler<Revision<TPlayer>>? OnSelfUpdate;
@@ -72,7 +79,7 @@ namespace JackboxGPT.Games.Common
                 Password = ""
             };
 
-            var url = new Uri($"wss://{_configuration.EcastHost}/api/v2/rooms/{_configuration.RoomCode.ToUpper()}/play?{bootstrap.AsQueryString()}");
+            var url = new Uri($"{_configuration.EcastHost.AsEcastUrl(true)}/api/v2/rooms/{_configuration.RoomCode.ToUpper()}/play?{bootstrap.AsQueryString()}");
 
             if (_instance == 0)
                 _logger.Debug($"Trying to connect to ecast websocket with url: {url}");
@@ -122,29 +129,115 @@ namespace JackboxGPT.Games.Common
             OnRoomUpdate?.Invoke(sender, e);
         }
 
+        private bool IsSelfKey(string? key)
+        {
+            return key == $"{KEY_PLAYER_PREFIX}{_playerId}" || key == $"{KEY_PLAYER_PREFIX}{_gameState.PlayerId}";
+        }
+
+        // Every room/player update ends up in one of these, whether it went through HandleOperation or ModelReader
+        protected virtual void UpdateSelf(TPlayer? self)
+        {
+            if (self == null) return;
+
+            InvokeOnSelfUpdateEvent(this, new Revision<TPlayer>(_gameState.Self, self));
+            _gameState.Self = self;
+        }
+
+        protected virtual void UpdateRoom(TRoom? room)
+        {
+            if (room == null) return;
+
+            InvokeOnRoomUpdateEvent(this, new Revision<TRoom>(_gameState.Room, room));
+            _gameState.Room = room;
+        }
+
         protected virtual void HandleOperation(IOperation op)
         {
-            if (op.Key == $"{KEY_PLAYER_PREFIX}{_playerId}" || op.Key == $"{KEY_PLAYER_PREFIX}{_gameState.PlayerId}")
-            {
-                var self = JsonConvert.DeserializeObject<TPlayer>(op.Value);
-                if (self == null) return;
+            if (IsSelfKey(op.Key))
+                UpdateSelf(JsonConvert.DeserializeObject<TPlayer>(op.Value));
+            else if (op.Key == KEY_ROOM)
+                UpdateRoom(JsonConvert.DeserializeObject<TRoom>(op.Value));
+        }
 
-                InvokeOnSelfUpdateEvent(this, new Revision<TPlayer>(_gameState.Self, self));
-                _gameState.Self = self;
+        // Handles room/player "object" messages without building the JRaw/ObjectOperation/model chain in between.
+        // Anything else (or anything the reader doesn't expect) returns false and goes through the usual path.
+        private bool TryReadModelUpdate(IModelReader<TRoom, TPlayer> modelReader, string text)
+        {
+            var buffer = ArrayPool<byte>.Shared.Rent(Encoding.UTF8.GetMaxByteCount(text.Length));
+            bool isSelf;
+            TPlayer? self = default;
+            TRoom? room = default;
+            try
+            {
+                var reader = new Utf8JsonReader(buffer.AsSpan(0, Encoding.UTF8.GetBytes(text, buffer)));
+                if (!reader.Read() || reader.TokenType != JsonTokenType.StartObject) return false;
+
+                // The opcode can come after the result, so remember where the result was
+                var isObject = false;
+                var hasResult = false;
+                var result = reader;
+                while (reader.Read() && reader.TokenType == JsonTokenType.PropertyName)
+                {
+                    if (reader.ValueTextEquals("opcode"u8) && reader.Read())
+                        isObject = reader.TokenType == JsonTokenType.String && reader.ValueTextEquals(OP_OBJECT);
+                    else if (reader.ValueTextEquals("result"u8) && reader.Read())
+                    {
+                        hasResult = true;
+                        result = reader;
+                        reader.Skip();
+                    }
+                    else if (reader.Read())
+                        reader.Skip();
+                }
+                if (!isObject || !hasResult || result.TokenType != JsonTokenType.StartObject) return false;
+
+                string? key = null;
+                var hasVal = false;
+                var val = result;
+                while (result.Read() && result.TokenType == JsonTokenType.PropertyName)
+                {
+                    if (result.ValueTextEquals("key"u8) && result.Read())
+                        key = result.GetString();
+                    else if (result.ValueTextEquals("val"u8) && result.Read())
+                    {
+                        hasVal = true;
+                        val = result;
+                        result.Skip();
+                    }
+                    else if (result.Read())
+                        result.Skip();
+                }
+                if (!hasVal) return false;
+
+                isSelf = IsSelfKey(key);
+                if (isSelf)
+                    self = modelReader.ReadPlayer(ref val);
+                else if (key == KEY_ROOM)
+                    room = modelReader.ReadRoom(ref val);
+                else
+                    return false;
             }
-            else if (op.Key == KEY_ROOM)
+            catch (Exception e) when (e is JsonException or InvalidOperationException or FormatException)
             {
-                var room = JsonConvert.DeserializeObject<TRoom>(op.Value);
-                if (room == null) return;
-
-                InvokeOnRoomUpdateEvent(this, new Revision<TRoom>(_gameState.Room, room));
-                _gameState.Room = room;
+                return false;
             }
+            finally
+            {
+                ArrayPool<byte>.Shared.Return(buffer);
+            }
+
+            // Outside of the try so a throwing event handler doesn't get the update a second time
+            if (isSelf)
+                UpdateSelf(self);
+            else
+                UpdateRoom(room);
+            return true;
         }
 
         private void WsReceived(ResponseMessage msg)
         {
             if (msg.Text == null) return;
+            if (ModelReader != null && TryReadModelUpdate(ModelReader, msg.Text)) return;
 
             var srvMsg = JsonConvert.DeserializeObject<ServerMessage<JRaw>>(msg.Text);
             
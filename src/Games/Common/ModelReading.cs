@@ -0,0 +1,56 @@
+#nullable enable
+using System;
+using System.Collections.Generic;
+using System.Text.Json;
+using Newtonsoft.Json.Linq;
+
+namespace JackboxGPT.Games.Common
+{
+    /// <summary>
+    /// Reads the Room/Player models straight from the UTF-8 message, instead of going through JRaw and reflection.
+    /// Implementations are generated by jb_api_gen.py when it's run with --readers.
+    /// </summary>
+    public interface IModelReader<TRoom, TPlayer>
+    {
+        public TRoom ReadRoom(ref Utf8JsonReader reader);
+        public TPlayer ReadPlayer(ref Utf8JsonReader reader);
+    }
+
+    public delegate T ValueReader<out T>(ref Utf8JsonReader reader);
+
+    // Helpers used by the generated readers
+    public static class ModelReading
+    {
+        public static void Expect(ref Utf8JsonReader reader, JsonTokenType type)
+        {
+            if (reader.TokenType != type)
+                throw new JsonException($"Expected {type} but got {reader.TokenType}");
+        }
+
+        public static List<T> ReadList<T>(ref Utf8JsonReader reader, ValueReader<T> readItem)
+        {
+            Expect(ref reader, JsonTokenType.StartArray);
+
+            var list = new List<T>();
+            while (reader.Read() && reader.TokenType != JsonTokenType.EndArray)
+                list.Add(readItem(ref reader));
+            return list;
+        }
+
+        // Member names in any case (what Newtonsoft writes back out), numbers in strings, or combined flags
+        public static T ReadEnumName<T>(ref Utf8JsonReader reader) where T : struct, Enum
+        {
+            var name = reader.GetString();
+            if (name != null && Enum.TryParse<T>(name, true, out var value))
+                return value;
+            throw new JsonException($"Unknown {typeof(T).Name} value \"{name}\"");
+        }
+
+        // Fields with no fixed type are kept as raw JSON, same as Newtonsoft does for them
+        public static JRaw ReadRaw(ref Utf8JsonReader reader)
+        {
+            using var document = JsonDocument.ParseValue(ref reader);
+            return new JRaw(document.RootElement.GetRawText());
+        }
+    }
+}
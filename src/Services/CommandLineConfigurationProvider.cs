@@ -22,5 +22,8 @@ namespace JackboxGPT.Services
 
         [Option("instances", Default = 1, HelpText = "The number of GPT players to spin up.")]
         public override int WorkerCount { get; set; }
+
+        [Option("ecast_host", Default = "ecast.jackboxgames.com", HelpText = "The Jackbox server to connect to. Start it with http:// to connect without TLS, e.g. to a local replay server from jb_api_gen.py")]
+        public override string EcastHost { get; set; } = "ecast.jackboxgames.com";
     }
 }
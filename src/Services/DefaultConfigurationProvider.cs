@@ -2,8 +2,7 @@
 {
     public abstract class DefaultConfigurationProvider : IConfigurationProvider
     {
-        public string EcastHost => "ecast.jackboxgames.com";
-        
+        public abstract string EcastHost { get; set; }
         public abstract string PlayerName { get; set; }
         public abstract string OpenAICompletionEngine { get; set; }
         public abstract string OpenAIChatEngine { get; set; }
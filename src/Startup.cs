@@ -5,6 +5,7 @@ using System.Net.Http;
 using System.Threading.Tasks;
 using Autofac;
 using JackboxGPT.Engines;
+using JackboxGPT.Extensions;
 using JackboxGPT.Games.BlatherRound;
 using JackboxGPT.Games.Bracketeering;
 using JackboxGPT.Games.Common.Models;
@@ -77,7 +78,7 @@ namespace JackboxGPT
                 logger.Information($"Trying to join room with code: {roomCode}");
             }
 
-            var response = await HttpClient.GetAsync($"https://{ecastHost}/api/v2/rooms/{roomCode}");
+            var response = await HttpClient.GetAsync($"{ecastHost.AsEcastUrl(false)}/api/v2/rooms/{roomCode}");
 
             try
             {
@@ -14,5 +14,15 @@ namespace Tests.Extensions
 
             post.Should().Be("hello I have nested! HTML tags ");
         }
+
+        [TestCase("ecast.jackboxgames.com", true, "wss://ecast.jackboxgames.com")]
+        [TestCase("ecast.jackboxgames.com", false, "https://ecast.jackboxgames.com")]
+        [TestCase("localhost:8080", true, "wss://localhost:8080")]
+        [TestCase("http://127.0.0.1:8080", true, "ws://127.0.0.1:8080")]
+        [TestCase("http://127.0.0.1:8080", false, "http://127.0.0.1:8080")]
+        public void ShouldBuildEcastUrl(string host, bool webSocket, string expected)
+        {
+            host.AsEcastUrl(webSocket).Should().Be(expected);
+        }
     }
 }